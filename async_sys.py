@@ -0,0 +1,358 @@
+# asyncio variants of the communication system and the nodes
+#   the blocking read_frame and write_frame of a Channel run on executor threads behind AsyncChannel, so that a node keeps working while a
+#   frame is in flight: the master reads the next command while it answers the current one and asks all of its slaves at once
+#   every translation and all bookkeeping is shared with the blocking classes, and commands are still answered strictly in order
+
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence, Tuple
+from comms_sys import BATCH_MAX, CommSystem
+from cs145lib.task2 import Channel
+from cs145lib.task2.utils import Employee
+from data_sys import DataSystem
+from log_sys import LOG
+from metrics_sys import NULL_METRICS, MetricsSystem
+from node_sys import OP_METRICS, MasterNode, SlaveDriver, SlaveNode
+from snap_sys import Snapshotter
+from space_sys import DEFAULT_SPACE, IdSpace
+from status import CommStatus, ControlStatus, DataStatus
+
+# a Channel whose frames are read and written on one thread each, so that a read and a write may wait at the same time
+#   while frames in either direction still go in order
+class AsyncChannel:
+
+  chan: Channel
+  reader: ThreadPoolExecutor
+  writer: ThreadPoolExecutor
+
+  def __init__(self, chan: Channel) -> None:
+    self.chan = chan
+    self.reader = ThreadPoolExecutor(max_workers=1)
+    self.writer = ThreadPoolExecutor(max_workers=1)
+
+  async def read_frame(self) -> bytes:
+    return await asyncio.get_running_loop().run_in_executor(self.reader, self.chan.read_frame)
+
+  async def write_frame(self, frame: bytes):
+    return await asyncio.get_running_loop().run_in_executor(self.writer, self.chan.write_frame, frame)
+
+  # nothing may be waiting on a read any more
+  def close(self):
+    self.reader.shutdown()
+    self.writer.shutdown()
+
+
+# a CommSystem over an AsyncChannel, whose frame-level calls are coroutines
+class AsyncCommSystem(CommSystem):
+
+  chan: AsyncChannel
+
+  async def _send(self, new_bytes: bytes):
+    return await self.chan.write_frame(self.frame(new_bytes))
+
+  async def _receive(self) -> bytes:
+    while (rcvd := self.accept(await self.chan.read_frame())) == None:
+      pass
+    return rcvd
+
+  async def send(self, item) -> bytes:
+    send_item = self.encode(item)
+    if self.tracks(item):
+      await self.make_room()
+      self.inflight[self.seq] = (self.requests, isinstance(item, list))
+    LOG.debug("%s %s as %s", 'submitting' if self.send_behavior == CommStatus.SUB else 'sending', item, send_item)
+    await self._send(send_item)
+    return send_item
+
+  async def _collect_one(self):
+    self.file(await self._receive())
+
+  async def make_room(self):
+    while len(self.inflight) >= self.window:
+      await self._collect_one()
+
+  async def collect(self, seq: int) -> Tuple | List[Tuple]:
+    while seq not in self.arrived:
+      await self._collect_one()
+    return self.arrived.pop(seq)
+
+  async def receive(self) -> Tuple:
+    if self.sequenced and self.rcv_behavior == CommStatus.DAT:
+      rcv_item = await self.collect(self.last_seq)
+      LOG.debug("received %s for seq %d", rcv_item, self.last_seq)
+      return rcv_item
+    rcv_bytes = await self._receive()
+    rcv_item = self.decode(rcv_bytes)
+    LOG.debug("received %s %s as %s", 'from god' if self.send_behavior == CommStatus.SUB else '', rcv_item, rcv_bytes)
+    return rcv_item
+
+  async def send_bulk(self, records: List[Tuple[int, int]], tag: ControlStatus = ControlStatus.BULK) -> int:
+    frames = self.send_bulk_translate(records, tag)
+    for frame in frames:
+      await self._send(frame)
+    LOG.info("sent %d records in %d bulk frames", len(records), len(frames))
+    return sum([len(frame) for frame in frames])
+
+  async def receive_bulk(self, tag: ControlStatus = ControlStatus.BULK) -> Tuple[List[Tuple[int, int]], int]:
+    records = []
+    total = 0
+    prev_id = 0
+    while True:
+      rcv_bytes = await self._receive()
+      total += len(rcv_bytes)
+      if rcv_bytes[1] == 0:
+        break
+      frame_records, prev_id = self.receive_bulk_translate(rcv_bytes, prev_id, tag)
+      records.extend(frame_records)
+    LOG.info("received %d records over %d bulk bytes", len(records), total)
+    return records, total
+
+  async def receive_batch(self) -> List[Tuple]:
+    if self.sequenced:
+      return await self.receive()
+    rcv_bytes = await self._receive()
+    rcv_items = self.receive_batch_translate(rcv_bytes, self.requests)
+    LOG.debug("received batch %s as %s", rcv_items, rcv_bytes)
+    return rcv_items
+
+
+# a SlaveDriver whose calls are coroutines, the master awaits several of them at once to overlap their round trips
+class AsyncSlaveDriver(SlaveDriver):
+
+  comms: AsyncCommSystem
+
+  def __init__(self, chan: Channel, ids: range | None = None, space: IdSpace = DEFAULT_SPACE) -> None:
+    self.comms = AsyncCommSystem(AsyncChannel(chan), CommStatus.CMD, CommStatus.DAT, space)
+    self.ids = ids if ids != None else range(space.size)
+    self.space = space
+
+  async def find(self, id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int, int]:
+    self.comms.set_control(ControlStatus.FIND)
+    await self.comms.send( (ControlStatus.FIND, id) )
+    return await self.comms.receive()
+
+  async def query(self, id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int]:
+    self.comms.set_control(ControlStatus.QUERY)
+    await self.comms.send( (ControlStatus.QUERY, id) )
+    return await self.comms.receive()
+
+  async def batch(self, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+    results = []
+    for i in range(0, len(cmds), BATCH_MAX):
+      self.comms.set_control(ControlStatus.BATCH)
+      await self.comms.send(cmds[i:i + BATCH_MAX])
+      results.extend(await self.comms.receive_batch())
+    return results
+
+  async def find_many(self, ids: List[int]) -> List[Tuple]:
+    return await self.batch([(ControlStatus.FIND, id) for id in ids])
+
+  async def query_many(self, ids: List[int]) -> List[Tuple]:
+    return await self.batch([(ControlStatus.QUERY, id) for id in ids])
+
+  # as SlaveDriver.negotiate, though only one command is ever in flight on this link so the window stays at 1
+  async def negotiate(self, compact: bool, sequenced: bool = False):
+    compact = compact or not self.comms.fixed or self.writes_back
+    self.comms.set_control(ControlStatus.HELO)
+    await self.comms.send( (ControlStatus.HELO, int(compact) | int(sequenced) << 1) )
+    assert await self.comms._receive() == bytes([DataStatus.OK.value])
+    self.comms.compact = compact
+    self.comms.sequenced = sequenced
+
+  async def store(self, id: int, p: int):
+    await self.comms.send( (ControlStatus.STORE, id, p) )
+
+  async def membership(self) -> List[range]:
+    self.comms.set_control(ControlStatus.MEMB)
+    await self.comms.send( (ControlStatus.MEMB, 0) )
+    runs, _ = await self.comms.receive_bulk(ControlStatus.MEMB)
+    return [range(start, start + length) for (start, length) in runs]
+
+  async def replicate(self) -> Tuple[List[Tuple[int, int]], int]:
+    self.comms.set_control(ControlStatus.BULK)
+    await self.comms.send( (ControlStatus.BULK, 0) )
+    return await self.comms.receive_bulk()
+
+  async def terminate(self):
+    await self.comms.send( (ControlStatus.TERM, 0) )
+    self.comms.chan.close()
+
+
+# a MasterNode driving AsyncSlaveDrivers
+#   the next command is read from the judge while the current one is answered, and a lookup the master cannot settle itself goes to every
+#   slave that could answer it at once; range_scan and the thread pool of concurrent mode have no part here
+class AsyncMasterNode(MasterNode):
+
+  comms: AsyncCommSystem
+
+  def __init__(self, chan: Channel, sources: List[DataSystem], metrics: MetricsSystem = NULL_METRICS, resolution_cache: int = 0,
+               capacity: int | None = None, operations: int | None = 1000, log_path: str | None = None,
+               snapshotter: Snapshotter | None = None, space: IdSpace = DEFAULT_SPACE) -> None:
+    super().__init__(chan, sources, metrics=metrics, resolution_cache=resolution_cache, capacity=capacity, operations=operations,
+                     log_path=log_path, snapshotter=snapshotter, space=space)
+    self.comms = AsyncCommSystem(AsyncChannel(chan), CommStatus.SUB, CommStatus.CMD, space)
+    self.comms.instrument(metrics, 'judge')
+
+  async def operate(self):
+    with open(self.log_path, 'w') if self.log_path != None else contextlib.nullcontext() as log, LOG.redirect(log):
+      await self.run()
+      await self.shutdown()
+
+  async def run(self):
+    operation_no = 0
+    incoming = asyncio.create_task(self.comms.receive())
+    while True:
+      cmd = await incoming
+      operation_no += 1
+      start = self.metrics.clock()
+      if cmd[0] == ControlStatus.TERM:
+        return
+
+      self.set_control(cmd[0])
+      self.comms.set_control(cmd[0])
+      self.sybil.set_control(cmd[0])
+
+      LOG.debug("### OPERATION %d: %s ###", operation_no, cmd)
+
+      if (result := self.recall(cmd)) != None:
+        pass
+      elif self.sybil.predict_id(operation_no, cmd[1]):
+        result = await self.search_sources(cmd, operation_no)
+        if result[0] == DataStatus.FAIL:
+          self.metrics.count('sybil.wasted')
+      else:
+        result = (DataStatus.FAIL, )
+
+      if self.resolution != None:
+        self.resolution.put(cmd[0], cmd[1], result[0], result[1] if self.control == ControlStatus.GIVE and result[0] != DataStatus.FAIL else None)
+
+      if self.control == ControlStatus.GIVE and result[0] != DataStatus.FAIL:
+        self.sources[0].give(result[0], result[1], cmd[2])
+
+      await self.comms.send(result)
+
+      # start reading the next command before the bookkeeping of this one, unless this was the last
+      if self.operations == None or operation_no < self.operations:
+        incoming = asyncio.create_task(self.comms.receive())
+
+      if self.placement != None:
+        used = None if result[0] == DataStatus.FAIL else result[1] if self.control == ControlStatus.GIVE else cmd[1]
+        if used != None:
+          self.placement.touch(used)
+        await self.evict(used)
+
+      self.metrics.observe(OP_METRICS[self.control], self.metrics.clock() - start)
+      if self.operations != None and operation_no >= self.operations:
+        return
+
+  # the master's own lookup first, then every routed slave at once if that did not settle the command
+  async def search_sources(self, cmd: Tuple, operation_no: int) -> Tuple:
+    result = self.lookup(self.sources[0], cmd[1])
+    remotes = [source for source in self.route(cmd)[1:] if isinstance(source, AsyncSlaveDriver)]
+    if not self.exact(result) and remotes:
+      start = self.metrics.clock()
+      temps = await asyncio.gather(*[source.find(cmd[1]) if self.control == ControlStatus.GIVE else source.query(cmd[1]) for source in remotes])
+      self.metrics.add_time('search.AsyncSlaveDriver', self.metrics.clock() - start)
+      # every slave's record is cached, but once one result is exact the rest no longer bear on the answer
+      for temp in temps:
+        self.cache_result(cmd, temp)
+        LOG.debug("#:%d slave found %s", operation_no, temp)
+        if not self.exact(result):
+          result = temp if self.exact(temp) else self.combine(result, temp)
+
+    self.sybil.interpret_result(result[0], cmd[1], result[1] if (self.control == ControlStatus.GIVE and result[0] != DataStatus.FAIL) else None)
+    return result
+
+  async def evict(self, keep: int | None = None):
+    assert self.placement != None
+    for id in self.placement.victims(self.sources[0].members(), keep):
+      owners = [source for source in self.sources[1:] if isinstance(source, AsyncSlaveDriver) and id in source.ids]
+      if not owners:
+        continue
+      assert owners[0].comms.compact, "write-back needs a compact link, negotiate after constructing the MasterNode"
+      await owners[0].store(id, self.sources[0].clear(id))
+      if self.resolution != None:
+        self.resolution.invalidate(id)
+      self.metrics.count('placement.evictions')
+
+  async def warm_start(self):
+    if self.sybil.restored:
+      return
+    presence = self.space.bytemap()
+    for id in self.sources[0].members():
+      presence[id] = 1
+    for runs in await asyncio.gather(*[source.membership() for source in self.sources[1:] if isinstance(source, AsyncSlaveDriver)]):
+      for run in runs:
+        presence[run.start:run.stop] = b'\x01' * len(run)
+    self.sybil.warm_start(presence)
+
+  async def replicate(self) -> int:
+    remotes = [source for source in self.sources[1:] if isinstance(source, AsyncSlaveDriver)]
+    total = 0
+    for (records, nbytes) in await asyncio.gather(*[source.replicate() for source in remotes]):
+      [self.cache_record(id, p) for (id, p) in records]
+      total += nbytes
+    self.retired.extend(remotes)
+    self.sources = self.sources[:1]
+    return total
+
+  async def shutdown(self):
+    if self.snapshotter != None:
+      self.snapshotter.save_sybil(self.sybil.white, self.sybil.black)
+    await asyncio.gather(*[source.terminate() for source in self.sources + self.retired if isinstance(source, AsyncSlaveDriver)])
+    [source.terminate() for source in self.sources if not isinstance(source, AsyncSlaveDriver)]
+    self.comms.chan.close()
+    self.sybil.terminate()
+    if self.resolution != None:
+      self.metrics.count('resolution.hits', self.resolution.hits)
+      self.metrics.count('resolution.misses', self.resolution.misses)
+      self.metrics.count('resolution.invalidations', self.resolution.invalidations)
+    self.metrics.terminate()
+
+
+# a SlaveNode whose loop awaits its channel
+class AsyncSlaveNode(SlaveNode):
+
+  comms: AsyncCommSystem
+
+  def __init__(self, data: Sequence[Employee], chan: Channel, backend: type[DataSystem] = DataSystem,
+               snapshotter: Snapshotter | None = None, space: IdSpace = DEFAULT_SPACE, partitions: int = 1,
+               threads: bool | None = None) -> None:
+    super().__init__(data, chan, backend, snapshotter, space=space, partitions=partitions, threads=threads)
+    self.comms = AsyncCommSystem(AsyncChannel(chan), CommStatus.DAT, CommStatus.CMD, space)
+
+  async def operate(self):
+    while True:
+      cmd = await self.comms.receive()
+
+      self.set_control(cmd[0])
+      self.comms.set_control(cmd[0])
+
+      match self.control:
+        case ControlStatus.TERM:
+          self.comms.chan.close()
+          self.data.terminate()
+          LOG.flush()
+          return
+        case ControlStatus.BULK:
+          await self.comms.send_bulk(self.data.records())
+          self.data = self.data.empty()
+          continue
+        case ControlStatus.MEMB:
+          await self.comms.send_bulk(self.runs(), ControlStatus.MEMB)
+          continue
+        case ControlStatus.STORE:
+          self.data.set(cmd[1], cmd[2])
+          continue
+        case ControlStatus.HELO:
+          await self.comms.send( (DataStatus.OK, ) )
+          self.comms.compact = bool(cmd[1] & 1) or not self.comms.fixed
+          self.comms.sequenced = bool(cmd[1] & 2)
+          continue
+        case ControlStatus.BATCH:
+          result = self.data.take_many(cmd[1])
+        case _:
+          result = self.execute(self.control, cmd[1])
+
+      await self.comms.send(result)
@@ -0,0 +1,158 @@
+# micro-benchmarks for the node subsystems, run as `python bench.py`
+
+import io
+import os
+import random
+import sys
+import time
+from comms_sys import CommSystem
+from data_sys import ColumnarDataSystem, DataSystem, SortedDataSystem
+from log_sys import DEBUG, WARN, LogSystem
+from node_sys import SybilSystem
+from part_sys import PartitionedDataSystem, free_threaded
+from sim import ID_SPACE, make_people
+from status import CommStatus, ControlStatus, DataStatus
+
+# time `lookups` calls of find on a fresh instance of backend, returning microseconds per call
+def time_find(backend: type, people: list, lookups: int, seed: int = 145) -> float:
+  rng = random.Random(seed)
+  targets = [rng.randrange(ID_SPACE) for _ in range(lookups)]
+  ds = backend(people)
+  start = time.perf_counter()
+  for t in targets:
+    ds.find(t)
+  return (time.perf_counter() - start) / lookups * 1e6
+
+# time a mixed workload of finds followed by the destructive clear a slave performs on every hit
+def time_find_clear(backend: type, people: list, lookups: int, seed: int = 145) -> float:
+  rng = random.Random(seed)
+  targets = [rng.randrange(ID_SPACE) for _ in range(lookups)]
+  ds = backend(people)
+  start = time.perf_counter()
+  for t in targets:
+    res = ds.find(t)
+    if len(res) > 1:
+      ds.clear(res[1])
+  return (time.perf_counter() - start) / lookups * 1e6
+
+def bench_find(lookups: int = 20000):
+  backends = [DataSystem, SortedDataSystem, ColumnarDataSystem]
+  print("density   " + "   ".join(f"{b.__name__.removesuffix('DataSystem').lower() or 'dict'} {op} (us)".rjust(24) for op in ('find', 'find+clear')
+                                    for b in backends))
+  for density in (0.0005, 0.002, 0.01, 0.05, 0.25, 1.0):
+    people = make_people(density)
+    row = [time_find(b, people, lookups) for b in backends] + [time_find_clear(b, people, lookups) for b in backends]
+    print(f"{density:<9} " + "   ".join(f"{v:>24.3f}" for v in row))
+
+# compare find and query one call per id against the bulk find_many and query_many on each backend
+def bench_many(lookups: int = 20000):
+  rng = random.Random(145)
+  targets = [rng.randrange(ID_SPACE) for _ in range(lookups)]
+  people = make_people(0.01)
+  print("backend                find (us)   find_many (us)   query (us)   query_many (us)")
+  for backend in (DataSystem, SortedDataSystem, ColumnarDataSystem):
+    ds = backend(people)
+    row = []
+    for run in (lambda: [ds.find(t) for t in targets], lambda: ds.find_many(targets),
+                lambda: [ds.query(t) for t in targets], lambda: ds.query_many(targets)):
+      start = time.perf_counter()
+      run()
+      row.append((time.perf_counter() - start) / lookups * 1e6)
+    print(f"{backend.__name__:<20} " + "   ".join(f"{v:>12.3f}" for v in row))
+
+# time SybilSystem construction and a GIVE predict/interpret cycle on random ids
+def bench_sybil(rounds: int = 20000):
+  start = time.perf_counter()
+  sybil = SybilSystem()
+  print(f"startup: {(time.perf_counter() - start) * 1e3:.3f} ms")
+  sybil.set_control(ControlStatus.GIVE)
+  rng = random.Random(145)
+  targets = [rng.randrange(ID_SPACE) for _ in range(rounds)]
+  start = time.perf_counter()
+  for t in targets:
+    sybil.predict_give(t)
+    sybil.interpret_give(DataStatus.FAIL, t, None)
+  print(f"predict_give + interpret_give(FAIL): {(time.perf_counter() - start) / rounds * 1e6:.3f} us")
+
+# compare the bytes a BULK hand-over puts on the wire against the lazy path, where every record migrates on its own
+#   FIND round trip (a 3-byte command and a 6-byte reply) and no slave miss is ever paid for, i.e. the lazy path's best case
+def bench_replicate():
+  comms = CommSystem(None, CommStatus.DAT, CommStatus.CMD)
+  print("records   frames   bulk bytes   lazy bytes (best case)")
+  for density in (0.0005, 0.002, 0.01, 0.05, 0.25, 0.5):
+    records = sorted([(emp.id, emp.balance) for emp in make_people(density)])
+    frames = comms.send_bulk_translate(records)
+    print(f"{len(records):<9} {len(frames):<8} {sum([len(f) for f in frames]):<12} {len(records) * (3 + 6)}")
+
+# time the per-frame translate paths on both ends of the slave link
+def bench_codec(rounds: int = 100000):
+  driver = CommSystem(None, CommStatus.CMD, CommStatus.DAT)
+  node = CommSystem(None, CommStatus.DAT, CommStatus.CMD)
+  driver.requests = [(ControlStatus.FIND, 4242)]
+  cmd = driver.send_cmd_translate((ControlStatus.FIND, 4242))
+  data = node.send_data_translate((DataStatus.CASE2, 4300, 54321))
+  batch = [(ControlStatus.QUERY, i) for i in range(32)]
+  batch_frame = driver.send_batch_translate(batch)
+  cases = [
+    ("send_cmd_translate", lambda: driver.send_cmd_translate((ControlStatus.FIND, 4242))),
+    ("receive_cmd_translate", lambda: node.receive_cmd_translate(cmd)),
+    ("send_data_translate", lambda: node.send_data_translate((DataStatus.CASE2, 4300, 54321))),
+    ("receive_data_translate", lambda: driver.receive_data_translate(data)),
+    ("send_batch_translate (32)", lambda: driver.send_batch_translate(batch)),
+    ("receive_cmd_translate (batch of 32)", lambda: node.receive_cmd_translate(batch_frame)),
+  ]
+  for (name, case) in cases:
+    start = time.perf_counter()
+    for _ in range(rounds):
+      case()
+    print(f"{name:<36} {(time.perf_counter() - start) / rounds * 1e9:>8.0f} ns")
+
+# time one per-operation log line printed eagerly against LogSystem disabled and enabled, each into an in-memory stream
+def bench_log(rounds: int = 100000):
+  (operation_no, cmd) = (4242, (ControlStatus.GIVE, 4300, 54321))
+  sink = io.StringIO()
+  (quiet, loud) = (LogSystem(WARN, sink), LogSystem(DEBUG, sink))
+  cases = [
+    ("print f-string", lambda: print(f"### OPERATION {operation_no}: {cmd} ###", file=sink)),
+    ("LogSystem.debug below level", lambda: quiet.debug("### OPERATION %d: %s ###", operation_no, cmd)),
+    ("LogSystem.debug at level", lambda: loud.debug("### OPERATION %d: %s ###", operation_no, cmd)),
+  ]
+  for (name, case) in cases:
+    start = time.perf_counter()
+    for _ in range(rounds):
+      case()
+    print(f"{name:<36} {(time.perf_counter() - start) / rounds * 1e9:>8.0f} ns")
+
+# time a slave taking batches of BATCH_MAX lookups, the records held by one DataSystem against partitioned over a growing number of workers
+#   the dict DataSystem is used as it probes id by id and so gives each lookup enough work to be worth shipping to a worker
+def bench_partitions(batches: int = 200, batch: int = 32):
+  people = make_people(0.05)
+  rng = random.Random(145)
+  cmds = [[(rng.choice([ControlStatus.FIND, ControlStatus.QUERY]), rng.randrange(ID_SPACE)) for _ in range(batch)] for _ in range(batches)]
+  print(f"{os.cpu_count()} cores, {'free-threaded' if free_threaded() else 'GIL'} build")
+  print("workers   kind       batches/s   speedup")
+  base = None
+  for (workers, threads) in [(0, False)] + [(n, threads) for threads in (False, True) for n in (1, 2, 4, 8)]:
+    ds = PartitionedDataSystem(people, partitions=workers, backend=DataSystem, threads=threads) if workers else DataSystem(people)
+    start = time.perf_counter()
+    [ds.take_many(b) for b in cmds]
+    rate = batches / (time.perf_counter() - start)
+    ds.terminate()
+    base = base or rate
+    kind = ('thread' if threads else 'process') if workers else 'serial'
+    print(f"{workers:<9} {kind:<10} {rate:>9.0f}   {rate / base:>7.2f}x")
+
+BENCHES = {
+  'find': bench_find,
+  'many': bench_many,
+  'sybil': bench_sybil,
+  'replicate': bench_replicate,
+  'codec': bench_codec,
+  'log': bench_log,
+  'partitions': bench_partitions,
+}
+
+if __name__ == '__main__':
+  for name in (sys.argv[1:] or BENCHES):
+    print(f"=== {name} ===")
+    BENCHES[name]()
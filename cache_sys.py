@@ -0,0 +1,100 @@
+# this class remembers how the master resolved past commands so that repeats skip the search pipeline entirely
+#   only the resolution (status and target id) is kept, balances are always read live from the master's own data
+
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict
+from heapq import nsmallest
+from typing import Collection, List, Tuple
+from status import ControlStatus, DataStatus
+
+class ResolutionCache:
+
+  # requested id -> (status, target id or None) per control, each in least to most recently used order
+  #   entries are keyed by the bare id, as hashing a (control, id) tuple runs the enum's hash in Python
+  gives: OrderedDict[int, Tuple[DataStatus, int | None]]
+  queries: OrderedDict[int, Tuple[DataStatus, int | None]]
+
+  # the ids of gives in order, so that the GIVE resolutions around an id are found by bisection and deleted as one slice
+  give_ids: List[int]
+
+  # how many entries gives and queries hold between them
+  capacity: int
+
+  # how far a membership change reaches: a GIVE on id resolves against [id - radius, id + radius]
+  radius: int
+
+  hits: int
+  misses: int
+  invalidations: int
+
+  def __init__(self, capacity: int, radius: int = 100) -> None:
+    self.gives = OrderedDict()
+    self.queries = OrderedDict()
+    self.give_ids = []
+    self.capacity = capacity
+    self.radius = radius
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+
+  def get(self, control: ControlStatus, id: int) -> Tuple[DataStatus, int | None] | None:
+    entries = self.gives if control is ControlStatus.GIVE else self.queries
+    ret = entries.get(id, None)
+    if ret == None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    entries.move_to_end(id)
+    return ret
+
+  # remember a resolution, making room by dropping the least recently used entry of the same control, or of the other if it is the only one
+  def put(self, control: ControlStatus, id: int, status: DataStatus, target: int | None):
+    entries = self.gives if control is ControlStatus.GIVE else self.queries
+    if id not in entries and entries is self.gives:
+      insort(self.give_ids, id)
+    entries[id] = (status, target)
+    entries.move_to_end(id)
+    if len(self.gives) + len(self.queries) <= self.capacity:
+      return
+    victims = entries if len(entries) > 1 else self.queries if entries is self.gives else self.gives
+    (victim, _) = victims.popitem(last=False)
+    if victims is self.gives:
+      del self.give_ids[bisect_left(self.give_ids, victim)]
+
+  # id joined or left a dataset: forget every resolution that could have seen it
+  def invalidate(self, id: int):
+    low = bisect_left(self.give_ids, id - self.radius)
+    high = bisect_right(self.give_ids, id + self.radius)
+    for i in self.give_ids[low:high]:
+      del self.gives[i]
+    del self.give_ids[low:high]
+    self.invalidations += high - low
+    if self.queries.pop(id, None) != None:
+      self.invalidations += 1
+
+
+# this class decides which records stay resident on the master: it counts how often each id is used and, once the master holds more than
+#   capacity records, picks the coldest ones to be written back to the slaves
+class PlacementPolicy:
+
+  frequency: Counter[int]
+  capacity: int
+
+  # how far below capacity an eviction brings the master, so that evictions come in batches rather than one per command
+  slack: int
+
+  def __init__(self, capacity: int) -> None:
+    self.frequency = Counter()
+    self.capacity = capacity
+    self.slack = max(capacity // 8, 1)
+
+  def touch(self, id: int):
+    self.frequency[id] += 1
+
+  # the coldest residents to evict, or nothing while the master is within capacity
+  #   keep, the id the current command resolved to, is never among them, so the slack never takes the master below it
+  def victims(self, residents: Collection[int], keep: int | None = None) -> List[int]:
+    if len(residents) <= self.capacity:
+      return []
+    return nsmallest(min(len(residents) - self.capacity + self.slack, len(residents) - (keep in residents)),
+                     [id for id in residents if id != keep], key=lambda id: self.frequency[id])
@@ -1,10 +1,89 @@
 # this class handles the communication of information as frames between systems
 
-import sys
+import functools
+import struct
 from cs145lib.task2 import Channel
-from typing import Tuple
+from typing import List, NamedTuple, Tuple
+from log_sys import LOG
+from metrics_sys import NULL_METRICS, MetricsSystem
+from space_sys import DEFAULT_SPACE, STRUCT_CODES, IdSpace
 from status import CommStatus, ControlStatus, DataStatus
 
+# the most lookups that will be packed into a single BATCH frame
+BATCH_MAX = 32
+
+# the largest frame a BULK transfer will emit
+BULK_FRAME_BYTES = 256
+
+# LEB128-style variable length integers: 7 bits per byte, high bit set on every byte but the last
+def encode_varint(n: int) -> bytes:
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def decode_varint(item: bytes, pos: int) -> Tuple[int, int]:
+    n = 0
+    shift = 0
+    while item[pos] & 0x80:
+        n |= (item[pos] & 0x7F) << shift
+        shift += 7
+        pos += 1
+    return n | (item[pos] << shift), pos + 1
+
+# the first id of the window a FIND_RANGE on id covers, offsets in its reply are relative to it
+def window_low(id: int, radius: int = 100) -> int:
+    return max(id - radius, 0)
+
+# whether a FIND_RANGE reply can carry the windows of a space, see send_range_translate
+def range_fits(space: IdSpace) -> bool:
+    return 2 * space.radius < 256
+
+# map signed integers onto unsigned ones so that small magnitudes of either sign stay small varints
+def zigzag(n: int) -> int:
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+def unzigzag(n: int) -> int:
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+# precompiled layouts of every fixed-width frame
+#   3-byte peso fields have no struct code so they are split into a high byte and a low short
+CMD_FRAME = struct.Struct('>BH')            # STATUS | ID
+GIVE_FRAME = struct.Struct('>BHI')          # STATUS | ID | PESOS [4 bytes]
+GIVE_FRAME_SHORT = struct.Struct('>BHBH')   # STATUS | ID | PESOS [3 bytes]
+STORE_FRAME = struct.Struct('>BHQ')         # STORE | ID | PESOS [8 bytes]
+BATCH_FRAMES = [struct.Struct('>BB' + 'BH' * n) for n in range(BATCH_MAX + 1)]   # BATCH | COUNT | (STATUS | ID) * COUNT
+FIND_DATA = struct.Struct('>BHBH')          # STATUS | ID | PESOS [3 bytes]
+QUERY_DATA = struct.Struct('>BBH')          # STATUS | PESOS [3 bytes]
+FAIL_DATA = struct.Struct('>B')             # STATUS
+SUB_GIVE = struct.Struct('>BB')             # OK | CASE
+SUB_QUERY = struct.Struct('>BQ')            # OK | PESOS [8 bytes]
+
+# the command layouts that depend on the width of ids and judge peso fields
+class Layouts(NamedTuple):
+    cmd_frame: struct.Struct
+    give_frame: struct.Struct
+    store_frame: struct.Struct
+    batch_frames: List[struct.Struct]
+
+# the command layouts of a space, those of the default space being the ones above
+@functools.cache
+def layouts(space: IdSpace) -> Layouts:
+    if (space.id_bytes, space.peso_bytes) == (DEFAULT_SPACE.id_bytes, DEFAULT_SPACE.peso_bytes):
+        return Layouts(CMD_FRAME, GIVE_FRAME, STORE_FRAME, BATCH_FRAMES)
+    id = STRUCT_CODES[space.id_bytes]
+    return Layouts(struct.Struct('>B' + id), struct.Struct('>B' + id + STRUCT_CODES[space.peso_bytes]), struct.Struct('>B' + id + 'Q'),
+                   [struct.Struct('>BB' + ('B' + id) * n) for n in range(BATCH_MAX + 1)])
+
+# the counts a CommSystem reports, each under its metrics_name followed by the key
+METRIC_KEYS = ('frames_sent', 'bytes_sent', 'frames_received', 'bytes_received', 'echoes_skipped')
+
+# enum lookups by wire value, cheaper than calling the enum
+CONTROL_VALUES: dict[int, ControlStatus] = dict([(control.value, control) for control in ControlStatus])
+DATA_VALUES: dict[int, DataStatus] = dict([(status.value, status) for status in DataStatus])
+
 class CommSystem:
         
     chan: Channel
@@ -22,13 +101,72 @@ class CommSystem:
     control: ControlStatus = ControlStatus.GIVE
     
     last_send = bytes([])
+    
+    # every frame sent since the last receive, any of them may still come back to us as an echo
+    echoes: List[bytes]
+    
+    # the (control, id) commands the next data frame answers: the ones last sent by a CMD sender or last received by a CMD receiver
+    requests: List[Tuple[ControlStatus, int]]
+    
+    # whether data frames use the compact encoding, see send_compact_translate, only ever negotiated on the node-to-node link
+    compact: bool = False
+    
+    # scratch space that multi-command frames are packed into before being copied out once
+    scratch: bytearray
+    
+    # whether node-to-node frames lead with a header byte structured as follows: DIRECTION [bit 7] | SEQ [bits 0-6]
+    #   commands travel with DIRECTION 0 and replies with DIRECTION 1 and the SEQ of the command they answer, so echoes are told apart
+    #   by their direction and replies are matched by SEQ rather than by arrival order, negotiated like compact
+    sequenced: bool = False
+    
+    # the most single-reply commands a CMD sender keeps in flight before it waits on the oldest reply, at most 64
+    window: int = 1
+    
+    # the SEQ of the next frame sent: a CMD sender counts it up, a DAT sender echoes that of the command being answered
+    seq: int = 0
+    
+    # the SEQ of the last command sent and of the last frame received
+    last_seq: int = 0
+    rcv_seq: int = 0
+    
+    # SEQ -> (commands, whether it was a batch) for commands awaiting a reply, and SEQ -> replies read before they were collected
+    inflight: dict[int, Tuple[List[Tuple[ControlStatus, int]], bool]]
+    arrived: dict[int, Tuple | List[Tuple]]
+    
+    # where frame and byte counts are reported, under names prefixed by metrics_name
+    metrics: MetricsSystem = NULL_METRICS
+    metrics_name: str = 'comms'
+    
+    # key -> full name of each count, built once by instrument rather than on every frame
+    metric_names: dict[str, str] = dict([(key, f"comms.{key}") for key in METRIC_KEYS])
+    
+    # the space ids and pesos are drawn from and the command layouts that follow from it
+    space: IdSpace
+    layouts: Layouts
+    
+    # whether the fixed-width data layouts, which only hold 16-bit ids and 3-byte balances, can carry the space's results
+    #   if not, a link must negotiate with HELO before use, which always settles on the compact encoding
+    fixed: bool
 
-    def __init__(self, chan: Channel, send_behavior: CommStatus, rcv_behavior: CommStatus) -> None:
+    def __init__(self, chan: Channel, send_behavior: CommStatus, rcv_behavior: CommStatus, space: IdSpace = DEFAULT_SPACE) -> None:
         self.chan = chan 
         self.buffer = bytes([])
+        self.echoes = []
+        self.requests = []
+        self.space = space
+        self.layouts = layouts(space)
+        self.fixed = self.layouts.cmd_frame is CMD_FRAME
+        self.scratch = bytearray(2 + self.layouts.cmd_frame.size * BATCH_MAX)
+        self.inflight = dict()
+        self.arrived = dict()
         self.send_behavior = send_behavior
         self.rcv_behavior = rcv_behavior
     
+    def instrument(self, metrics: MetricsSystem, name: str):
+        self.metrics = metrics
+        self.metrics_name = name
+        self.metric_names = dict([(key, f"{name}.{key}") for key in METRIC_KEYS])
+    
     # change the control state of the system, note that by the principles through which the system is designed, CommSys should not by driving its own control state
     #   it should instead rely on its parent system to drive
     def set_control(self, new_control: ControlStatus) -> None:
@@ -36,10 +174,11 @@ class CommSystem:
 
     def send_translate(self, item: int | DataStatus | ControlStatus | Tuple[DataStatus | ControlStatus, int] | Tuple[DataStatus | ControlStatus, int, int], is_employee_id=False) -> bytes:
         # if the item is an int and id is False (i.e. it is a number representing currency in range(20000, 100000 + 1)), force to 3-bytes in big-endian order
-        # if the item is an int and id is True (i.e. it is a number representing an id in range(65535 + 1)), force to 2-bytes in big-endian order
+        #   or 8 bytes in a space the fixed layouts cannot carry
+        # if the item is an int and id is True (i.e. it is a number representing an id in range(space.size)), force to the space's id width in big-endian order
   
         if isinstance(item, int):
-            return item.to_bytes(2 if is_employee_id else 3, 'big')
+            return item.to_bytes(self.space.id_bytes if is_employee_id else (3 if self.fixed else 8), 'big')
         
         # if the item is a tuple (i.e. it is a DataStatus followed by an int), return each item parsed as bytes
         if isinstance(item, Tuple) and len(item) == 2:
@@ -54,98 +193,349 @@ class CommSystem:
         # otherwise (the item is a DataStatus | ControlStatus), return as a single byte
         return item.value.to_bytes(1, 'big')
     
-    def send_cmd_translate(self, item: Tuple[ControlStatus, int]): 
-        return b''.join([item[0].value.to_bytes(1, 'big'), item[1].to_bytes(2, 'big')])
+    # a 3-item command is a STORE, whose balance may have grown past any judge peso field and so takes 8 bytes
+    def send_cmd_translate(self, item: Tuple[ControlStatus, int] | Tuple[ControlStatus, int, int]): 
+        if len(item) == 3:
+            return self.layouts.store_frame.pack(item[0].value, item[1], item[2])
+        return self.layouts.cmd_frame.pack(item[0].value, item[1])
+    
+    # pack several commands into one frame structured as follows: BATCH [0] | COUNT [1] | (STATUS | ID [2 bytes]) * COUNT
+    #   ids are wider in a wider space, where a batch can be as long as a give, so batches are told apart by their STATUS, see
+    #   receive_cmd_translate
+    def send_batch_translate(self, items: List[Tuple[ControlStatus, int]]) -> bytes:
+        assert 0 < len(items) <= BATCH_MAX
+        frame = self.layouts.batch_frames[len(items)]
+        frame.pack_into(self.scratch, 0, ControlStatus.BATCH.value, len(items), *[field for (control, id) in items for field in (control.value, id)])
+        return bytes(memoryview(self.scratch)[:frame.size])
     
     def send_data_translate(self, item: Tuple[DataStatus] | Tuple[DataStatus, int] | Tuple[DataStatus, int, int]):
         match len(item):
             case 1:
-                return  b''.join([self.send_translate(item[0])])
+                return FAIL_DATA.pack(item[0].value)
             case 2:
-                return b''.join([self.send_translate(item[0]), self.send_translate(item[1])])
+                return QUERY_DATA.pack(item[0].value, item[1] >> 16, item[1] & 0xFFFF)
             case 3:
-                return b''.join([self.send_translate(item[0]), self.send_translate(item[1], True), self.send_translate(item[2])])
+                return FIND_DATA.pack(item[0].value, item[1], item[2] >> 16, item[2] & 0xFFFF)
+    
+    # translate a result in the compact encoding given the (control, id) command it answers
+    #   FAIL is a single zero byte; otherwise a QUERY result is varint(balance + 1) and a FIND result is varint(zigzag(target - id) + 1) | varint(balance)
+    #   a FIND result's case is folded into the sign of the delta: CASE1 is 0, CASE2 is positive and CASE3 negative
+    def send_compact_translate(self, item: Tuple, cmd: Tuple[ControlStatus, int]) -> bytes:
+        if item[0] == DataStatus.FAIL:
+            return bytes([0])
+        if cmd[0] == ControlStatus.FIND:
+            return encode_varint(zigzag(item[1] - cmd[1]) + 1) + encode_varint(item[2])
+        return encode_varint(item[1] + 1)
     
     # translate an item for submission to lolo
     def submit_translate(self, item: Tuple[DataStatus] | Tuple[DataStatus, int]) -> bytes:
         # no matter what, if FAIL, return FAIL
         if item[0] == DataStatus.FAIL:
-            return bytes([DataStatus.FAIL.value])
+            return FAIL_DATA.pack(DataStatus.FAIL.value)
         
         # if success, proceed along the necessary lane
         if self.control == ControlStatus.GIVE:
             assert isinstance(item[0], DataStatus)
-            return bytes([DataStatus.OK.value, item[0].value])
+            return SUB_GIVE.pack(DataStatus.OK.value, item[0].value)
         
         # if the control status is for anything else send the peso value as 8 bytes,
         else:
             assert isinstance(item[1], int)
-            as_bytes = item[1].to_bytes(8, 'big')
-            return b''.join([bytes([item[0].value]), as_bytes])
+            return SUB_QUERY.pack(item[0].value, item[1])
 
     # translate a received byte sequence as a command, note that a control status is optional since the length of the command equivalently encodes for type
     def receive_cmd_translate(self, item: bytes) -> Tuple[ControlStatus, int, int] | Tuple[ControlStatus, int]:
+        (give, store, cmd) = (self.layouts.give_frame, self.layouts.store_frame, self.layouts.cmd_frame)
         match len(item):
+            # an empty frame ends a stream of commands
+            case 0:
+                return (ControlStatus.TERM, 0)
+            # parse an 11-byte STORE from the master to a slave, see STORE_FRAME, told apart from batches and wider spaces' gives by its STATUS
+            case n if n == store.size and item[0] == ControlStatus.STORE.value:
+                (_, id, p) = store.unpack_from(item)
+                return (ControlStatus.STORE, id, p)
+            # parse a batch of commands, see send_batch_translate, before gives are matched by length alone as a batch may be as long
+            case n if n > 2 and item[0] == ControlStatus.BATCH.value and n == 2 + cmd.size * item[1]:
+                return (ControlStatus.BATCH, [(CONTROL_VALUES[control], id) for (control, id) in cmd.iter_unpack(memoryview(item)[2:])])
             # parse a 7 or 6-byte give command structured as follows: STATUS [0] | ID [1, 2] | PESOS [3, 4, 5, 6]
-            case 7 | 6:
-                return (ControlStatus.GIVE, int.from_bytes(item[1:3], 'big'), int.from_bytes(item[3:], 'big'))
-            # parse a 3 or 2-byte query commmand structured as follows: STATUS [0] | ID [1, 2]
-            case 3 | 2:
-                match item[0]:
-                    case ControlStatus.QUERY.value:
-                        return (ControlStatus.QUERY, int.from_bytes(item[1:], 'big'))
-                    case ControlStatus.FIND.value:
-                        return (ControlStatus.FIND, int.from_bytes(item[1:], 'big'))
+            case n if n == give.size:
+                (_, id, p) = give.unpack_from(item)
+                return (ControlStatus.GIVE, id, p)
+            case 6 if self.fixed:
+                (_, id, p_hi, p_lo) = GIVE_FRAME_SHORT.unpack_from(item)
+                return (ControlStatus.GIVE, id, (p_hi << 16) | p_lo)
+            # parse a 3-byte command structured as follows: STATUS [0] | ID [1, 2]
+            case n if n == cmd.size and item[0] in CONTROL_VALUES:
+                (control, id) = cmd.unpack_from(item)
+                return (CONTROL_VALUES[control], id)
+            # parse a 2-byte query commmand structured as follows: STATUS [0] | ID [1]
+            case 2 if self.fixed and item[0] in CONTROL_VALUES:
+                return (CONTROL_VALUES[item[0]], item[1])
             case _:
                 raise ValueError("what the hell did you feed me")
     
     # translate a received byte sequence as data in a *similar* format to give commands or as a FAIL, note that the DataStatus byte is important
     def receive_data_translate(self, item: bytes) -> Tuple[DataStatus, int, int] | Tuple[DataStatus]:
-        match DataStatus(item[0]):
-            case DataStatus.FAIL:
-                return (DataStatus.FAIL, )
-            case _:
-                if self.control == ControlStatus.FIND:
-                    return (DataStatus(item[0]), int.from_bytes(item[1:3], 'big'), int.from_bytes(item[3:], 'big'))
-                else:
-                    return (DataStatus(item[0]), int.from_bytes(item[1:], 'big'))
+        return self.data_at(item, 0, self.requests[0])[0]
+    
+    # parse the data result starting at pos of item for the given (control, id) command, returning it along with the position just past it
+    #   FAIL is a lone status byte, a FIND result spans 6 bytes and a QUERY result 4
+    def data_at(self, item: bytes, pos: int, cmd: Tuple[ControlStatus, int]) -> Tuple[Tuple, int]:
+        if cmd[0] == ControlStatus.FIND_RANGE:
+            return self.range_at(item, pos, cmd)
+        if self.compact:
+            return self.compact_at(item, pos, cmd)
+        status = DATA_VALUES[item[pos]]
+        if status == DataStatus.FAIL:
+            return (DataStatus.FAIL, ), pos + 1
+        if cmd[0] == ControlStatus.FIND:
+            (_, id, p_hi, p_lo) = FIND_DATA.unpack_from(item, pos)
+            return (status, id, (p_hi << 16) | p_lo), pos + FIND_DATA.size
+        (_, p_hi, p_lo) = QUERY_DATA.unpack_from(item, pos)
+        return (status, (p_hi << 16) | p_lo), pos + QUERY_DATA.size
+    
+    # translate the reply to a FIND_RANGE, an (OK, records) pair listing every (id, balance) in the window, structured as follows:
+    #   COUNT [1] | (OFFSET [1] | BALANCE [varint]) * COUNT, each OFFSET being the id less window_low of the requested id
+    #   the offsets only fit their byte while the window is at most 256 ids wide
+    def send_range_translate(self, item: Tuple[DataStatus, List[Tuple[int, int]]], cmd: Tuple[ControlStatus, int]) -> bytes:
+        assert range_fits(self.space)
+        low = window_low(cmd[1], self.space.radius)
+        return bytes([len(item[1])]) + b''.join([bytes([id - low]) + encode_varint(p) for (id, p) in item[1]])
+    
+    def range_at(self, item: bytes, pos: int, cmd: Tuple[ControlStatus, int]) -> Tuple[Tuple, int]:
+        low = window_low(cmd[1], self.space.radius)
+        records = []
+        count = item[pos]
+        pos += 1
+        for _ in range(count):
+            offset = item[pos]
+            p, pos = decode_varint(item, pos + 1)
+            records.append((low + offset, p))
+        return (DataStatus.OK, records), pos
+    
+    # translate one result for the command it answers, in whichever encoding the link uses
+    def result_translate(self, item: Tuple, cmd: Tuple[ControlStatus, int]) -> bytes:
+        if cmd[0] == ControlStatus.FIND_RANGE:
+            return self.send_range_translate(item, cmd)
+        if self.compact:
+            return self.send_compact_translate(item, cmd)
+        return self.send_data_translate(item)
+    
+    # the compact counterpart of data_at, see send_compact_translate
+    def compact_at(self, item: bytes, pos: int, cmd: Tuple[ControlStatus, int]) -> Tuple[Tuple, int]:
+        head, pos = decode_varint(item, pos)
+        if head == 0:
+            return (DataStatus.FAIL, ), pos
+        if cmd[0] != ControlStatus.FIND:
+            return (DataStatus.OK, head - 1), pos
+        delta = unzigzag(head - 1)
+        p, pos = decode_varint(item, pos)
+        return (DataStatus.CASE1 if delta == 0 else DataStatus.CASE2 if delta > 0 else DataStatus.CASE3, cmd[1] + delta, p), pos
+    
+    # translate a reply to a BATCH frame, which is the concatenation of the results for each of the batched commands in order
+    def receive_batch_translate(self, item: bytes, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+        results = []
+        pos = 0
+        for cmd in cmds:
+            result, pos = self.data_at(item, pos, cmd)
+            results.append(result)
+        return results
 
-    def _send(self, new_bytes: bytes):
+    # split (id, balance) records, sorted by id, into BULK frames structured as follows: BULK [0] | COUNT [1] | (ID DELTA | BALANCE) * COUNT
+    #   both fields are varints and each id is the delta from the previous record's id, carrying over across frames
+    #   the stream ends with an empty frame (COUNT = 0)
+    #   any other pairs sorted by their first field can travel the same way under another tag, e.g. MEMB for (start, length) runs of ids
+    def send_bulk_translate(self, records: List[Tuple[int, int]], tag: ControlStatus = ControlStatus.BULK) -> List[bytes]:
+        frames = []
+        frame = bytearray()
+        count = 0
+        prev_id = 0
+        for (id, p) in records:
+            pair = encode_varint(id - prev_id) + encode_varint(p)
+            if count == 255 or 2 + len(frame) + len(pair) > BULK_FRAME_BYTES:
+                frames.append(bytes([tag.value, count]) + frame)
+                frame = bytearray()
+                count = 0
+            frame += pair
+            count += 1
+            prev_id = id
+        if count:
+            frames.append(bytes([tag.value, count]) + frame)
+        frames.append(bytes([tag.value, 0]))
+        return frames
+    
+    # translate one BULK frame given the last id of the previous frame, returning its records and the last id seen
+    def receive_bulk_translate(self, item: bytes, prev_id: int, tag: ControlStatus = ControlStatus.BULK) -> Tuple[List[Tuple[int, int]], int]:
+        assert item[0] == tag.value
+        records = []
+        pos = 2
+        for _ in range(item[1]):
+            delta, pos = decode_varint(item, pos)
+            p, pos = decode_varint(item, pos)
+            prev_id += delta
+            records.append((prev_id, p))
+        return records, prev_id
+
+    def direction(self) -> int:
+        return 0x80 if self.send_behavior == CommStatus.DAT else 0
+
+    # stamp an outgoing frame with its SEQ header or remember it as a possible echo, returning what goes on the wire
+    def frame(self, new_bytes: bytes) -> bytes:
         # we are no longer using the buffered sending approach
+        if self.sequenced:
+            new_bytes = bytes([self.direction() | self.seq]) + new_bytes
+            if self.send_behavior == CommStatus.CMD:
+                self.last_seq = self.seq
+                self.seq = (self.seq + 1) & 0x7F
+        else:
+            self.echoes.append(new_bytes)
         self.last_send = new_bytes
-        return self.chan.write_frame(new_bytes)
+        if self.metrics.enabled:
+            self.metrics.count(self.metric_names['frames_sent'])
+            self.metrics.count(self.metric_names['bytes_sent'], len(new_bytes))
+        return new_bytes
 
-    def _receive(self) -> bytes:
-        rcvd = self.chan.read_frame()
+    def _send(self, new_bytes: bytes):
+        return self.chan.write_frame(self.frame(new_bytes))
+
+    # the payload of a frame read off the channel, or None if it is to be skipped
+    #   skip anything travelling in our own direction and any echo of the frames sent before the link was sequenced, then strip the header
+    #   without a sequenced link skip the bytes we sent since we last listened
+    def accept(self, rcvd: bytes) -> bytes | None:
+        if self.sequenced:
+            if rcvd in self.echoes or rcvd[0] & 0x80 == self.direction():
+                self.tally_echo()
+                return None
+            self.echoes.clear()
+            self.tally_received(rcvd)
+            self.rcv_seq = rcvd[0] & 0x7F
+            if self.send_behavior == CommStatus.DAT:
+                self.seq = self.rcv_seq
+            return rcvd[1:]
         
-        # wait until we stop receiving our last sent bytes
-        while rcvd == self.last_send:
-            rcvd = self.chan.read_frame()
-            
+        if rcvd in self.echoes:
+            self.echoes.remove(rcvd)
+            self.tally_echo()
+            return None
+        
+        self.echoes.clear()
+        self.tally_received(rcvd)
         return rcvd
     
-    # send some properly formatted item, return the bytes for debugging
-    def send(self, item) -> bytes:
-        send_item: bytes = bytes()
+    def tally_echo(self):
+        if self.metrics.enabled:
+            self.metrics.count(self.metric_names['echoes_skipped'])
+    
+    def tally_received(self, rcvd: bytes):
+        if self.metrics.enabled:
+            self.metrics.count(self.metric_names['frames_received'])
+            self.metrics.count(self.metric_names['bytes_received'], len(rcvd))
+
+    def _receive(self) -> bytes:
+        while (rcvd := self.accept(self.chan.read_frame())) == None:
+            pass
+        return rcvd
+    
+    # translate an item for sending, a list of items being a single batch frame
+    def encode(self, item) -> bytes:
         match self.send_behavior:
             case CommStatus.SUB:
-                send_item = self.submit_translate(item)
+                return self.submit_translate(item)
             case CommStatus.DAT:
-                send_item = self.send_data_translate(item)
+                items = item if isinstance(item, list) else [item]
+                return b''.join([self.result_translate(i, cmd) for (i, cmd) in zip(items, self.requests)])
             case CommStatus.CMD:
-                send_item = self.send_cmd_translate(item)
-        print(f"{'submitting' if self.send_behavior == CommStatus.SUB else 'sending'} {item} as {send_item}", file=sys.stderr)
+                self.requests = item if isinstance(item, list) else [item]
+                return self.send_batch_translate(item) if isinstance(item, list) else self.send_cmd_translate(item)
+        return bytes()
+    
+    # whether the command item is tracked in flight, only FIND, QUERY, FIND_RANGE and BATCH are answered by exactly one reply frame
+    def tracks(self, item) -> bool:
+        return (self.sequenced and self.send_behavior == CommStatus.CMD
+                and (isinstance(item, list) or item[0] in (ControlStatus.FIND, ControlStatus.QUERY, ControlStatus.FIND_RANGE)))
+    
+    # send some properly formatted item, return the bytes for debugging
+    #   a list of items is sent as a single batch frame
+    def send(self, item) -> bytes:
+        send_item = self.encode(item)
+        if self.tracks(item):
+            self.make_room()
+            self.inflight[self.seq] = (self.requests, isinstance(item, list))
+        LOG.debug("%s %s as %s", 'submitting' if self.send_behavior == CommStatus.SUB else 'sending', item, send_item)
         self._send(send_item)
         return send_item
     
-    # receive some properly formatted item
-    def receive(self) -> Tuple:
-        rcv_bytes: bytes = self._receive()
+    # file one reply frame under the SEQ it was read with
+    def file(self, rcv_bytes: bytes):
+        (cmds, is_batch) = self.inflight.pop(self.rcv_seq)
+        rcv_items = self.receive_batch_translate(rcv_bytes, cmds)
+        self.arrived[self.rcv_seq] = rcv_items if is_batch else rcv_items[0]
+    
+    # read one reply frame and file it under its SEQ
+    def _collect_one(self):
+        self.file(self._receive())
+    
+    # block until at most window - 1 commands are in flight
+    def make_room(self):
+        while len(self.inflight) >= self.window:
+            self._collect_one()
+    
+    # block until the reply to the command sent under seq has arrived and return it
+    def collect(self, seq: int) -> Tuple | List[Tuple]:
+        while seq not in self.arrived:
+            self._collect_one()
+        return self.arrived.pop(seq)
+    
+    # translate a received frame according to what this end receives
+    def decode(self, rcv_bytes: bytes) -> Tuple:
         match self.rcv_behavior:
             case CommStatus.CMD:
                 rcv_item = self.receive_cmd_translate(rcv_bytes)
-            case CommStatus.DAT:
-                rcv_item = self.receive_data_translate(rcv_bytes)
-        print(f"received {'from god' if self.send_behavior == CommStatus.SUB else ''} {rcv_item} as {rcv_bytes}", file=sys.stderr)
+                self.requests = rcv_item[1] if rcv_item[0] == ControlStatus.BATCH else [rcv_item]
+                return rcv_item
+            case _:
+                return self.receive_data_translate(rcv_bytes)
+    
+    # receive some properly formatted item
+    def receive(self) -> Tuple:
+        # with sequenced frames the reply may already have been read while waiting on another
+        if self.sequenced and self.rcv_behavior == CommStatus.DAT:
+            rcv_item = self.collect(self.last_seq)
+            LOG.debug("received %s for seq %d", rcv_item, self.last_seq)
+            return rcv_item
+        rcv_bytes: bytes = self._receive()
+        rcv_item = self.decode(rcv_bytes)
+        LOG.debug("received %s %s as %s", 'from god' if self.send_behavior == CommStatus.SUB else '', rcv_item, rcv_bytes)
         return rcv_item
+    
+    # stream records to the other end as a multi-frame BULK transfer, returning the total bytes sent
+    def send_bulk(self, records: List[Tuple[int, int]], tag: ControlStatus = ControlStatus.BULK) -> int:
+        frames = self.send_bulk_translate(records, tag)
+        [self._send(frame) for frame in frames]
+        LOG.info("sent %d records in %d bulk frames", len(records), len(frames))
+        return sum([len(frame) for frame in frames])
+    
+    # receive a complete BULK transfer, returning its records and the total bytes received
+    def receive_bulk(self, tag: ControlStatus = ControlStatus.BULK) -> Tuple[List[Tuple[int, int]], int]:
+        records = []
+        total = 0
+        prev_id = 0
+        while True:
+            rcv_bytes = self._receive()
+            total += len(rcv_bytes)
+            if rcv_bytes[1] == 0:
+                break
+            frame_records, prev_id = self.receive_bulk_translate(rcv_bytes, prev_id, tag)
+            records.extend(frame_records)
+        LOG.info("received %d records over %d bulk bytes", len(records), total)
+        return records, total
+    
+    # receive the reply to the batch frame last sent
+    def receive_batch(self) -> List[Tuple]:
+        if self.sequenced:
+            return self.receive()
+        rcv_bytes: bytes = self._receive()
+        rcv_items = self.receive_batch_translate(rcv_bytes, self.requests)
+        LOG.debug("received batch %s as %s", rcv_items, rcv_bytes)
+        return rcv_items
     
\ No newline at end of file
@@ -1,18 +1,35 @@
 # this class handles the manipulation of data within a node
 
-from collections.abc import Sequence
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Collection, Sequence
 from math import floor
-import sys
 from cs145lib.task2 import Employee
-from typing import Tuple
-from status import DataStatus
+from log_sys import LOG
+from typing import Iterator, List, Tuple
+from space_sys import DEFAULT_SPACE, IdSpace, PagedBytes
+from status import ControlStatus, DataStatus
+
+# the part of p pesos an approximate match receives
+def share(case: DataStatus, p: int) -> int:
+  match case:
+    case DataStatus.CASE2:
+      return floor(p / 2)
+    case DataStatus.CASE3:
+      return floor(p / 3)
+    case _:
+      return p
 
 class DataSystem:
   
   data: dict[int, int] = dict()
+  
+  # the space ids come from, of which only the search radius matters to a dict
+  space: IdSpace = DEFAULT_SPACE
 
-  def __init__(self, data: Sequence[Employee]) -> None:
+  def __init__(self, data: Sequence[Employee], space: IdSpace = DEFAULT_SPACE) -> None:
     self.data = dict([(emp.id, emp.balance) for emp in data])
+    self.space = space
 
   # try and retrieve the nearest EmployeeID within range of bound
   def try_retrieve(self, employee_id: int, bound: int) -> int | None:
@@ -30,9 +47,9 @@ class DataSystem:
     # try to get the data value at id 
     if (target := employee_id if self.data.get(employee_id, None) != None else None) != None:
         ret = DataStatus.CASE1
-    elif (target := self.try_retrieve(employee_id, 100)) != None:
+    elif (target := self.try_retrieve(employee_id, self.space.radius)) != None:
         ret = DataStatus.CASE2
-    elif (target := self.try_retrieve(employee_id, -100)) != None:
+    elif (target := self.try_retrieve(employee_id, -self.space.radius)) != None:
         ret = DataStatus.CASE3
 
     if ret == DataStatus.FAIL:
@@ -42,17 +59,7 @@ class DataSystem:
 
   # give the employee with id 'id' 'p' pesos
   def give(self, case: DataStatus, employee_id: int, p: int):
-    target_p : int
-    
-    match case:
-      case DataStatus.CASE2:
-        target_p = floor(p / 2)
-      case DataStatus.CASE3:
-        target_p = floor(p / 3)
-      case _:
-        target_p = p
-    
-    self.data[employee_id] += target_p
+    self.data[employee_id] += share(case, p)
     
   def set(self, employee_id: int, p: int):
     self.data[employee_id] = p
@@ -64,9 +71,216 @@ class DataSystem:
 
   # clear the entry associated with the id
   def clear(self, employee_id: int):
-    print(f"destroying record for id:{employee_id}")
+    LOG.debug("destroying record for id:%d", employee_id)
     return self.data.pop(employee_id)
   
+  # every (id, balance) with id in [low, high], in id order
+  def scan(self, low: int, high: int) -> List[Tuple[int, int]]:
+    return [(i, self.data[i]) for i in range(low, high + 1) if i in self.data]
+  
+  # the ids this DataSystem holds records for
+  def members(self):
+    return self.data.keys()
+  
+  # every (id, balance) held, in id order
+  def records(self) -> List[Tuple[int, int]]:
+    return sorted(self.data.items())
+  
+  # the bulk forms of find, query and give, one result per id in order, which backends may answer without a call per id
+  def find_many(self, ids: List[int]) -> List[Tuple]:
+    return [self.find(id) for id in ids]
+  
+  def query_many(self, ids: List[int]) -> List[Tuple]:
+    return [self.query(id) for id in ids]
+  
+  # apply (case, id, pesos) gives in order
+  def give_many(self, gives: List[Tuple[DataStatus, int, int]]):
+    [self.give(case, id, p) for (case, id, p) in gives]
+  
+  # the destructive lookup of a slave: FIND or QUERY id as control says and wipe the record returned, if any
+  def take(self, control: ControlStatus, employee_id: int) -> Tuple:
+    result = self.find(employee_id) if control == ControlStatus.FIND else self.query(employee_id)
+    if result[0] != DataStatus.FAIL:
+      self.clear(result[1] if control == ControlStatus.FIND else employee_id)
+    return result
+  
+  def take_many(self, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+    return [self.take(control, id) for (control, id) in cmds]
+  
+  # a DataSystem of the same kind holding no records
+  def empty(self) -> 'DataSystem':
+    return type(self)([], self.space)
+  
   # end operation, useless for DataSystem
   def terminate(self):
-    pass
\ No newline at end of file
+    pass
+
+
+# a DataSystem that additionally keeps its ids in a sorted array so that neighbor lookups bisect instead of probing id by id
+class SortedDataSystem(DataSystem):
+
+  ids: list[int]
+
+  def __init__(self, data: Sequence[Employee], space: IdSpace = DEFAULT_SPACE) -> None:
+    super().__init__(data, space)
+    self.ids = sorted(self.data)
+
+  # bisect to the nearest id in the direction of bound, accepting it only if it lies within |bound| of employee_id
+  def try_retrieve(self, employee_id: int, bound: int) -> int | None:
+    if bound >= 0:
+      i = bisect_left(self.ids, employee_id)
+      if i < len(self.ids) and self.ids[i] <= employee_id + bound:
+        return self.ids[i]
+    else:
+      i = bisect_right(self.ids, employee_id)
+      if i > 0 and self.ids[i - 1] >= employee_id + bound:
+        return self.ids[i - 1]
+    return None
+
+  def set(self, employee_id: int, p: int):
+    if employee_id not in self.data:
+      insort(self.ids, employee_id)
+    self.data[employee_id] = p
+
+  def scan(self, low: int, high: int) -> List[Tuple[int, int]]:
+    return [(i, self.data[i]) for i in self.ids[bisect_left(self.ids, low):bisect_right(self.ids, high)]]
+
+  def clear(self, employee_id: int):
+    ret = super().clear(employee_id)
+    del self.ids[bisect_left(self.ids, employee_id)]
+    return ret
+
+
+# the ids held by a ColumnarDataSystem, read straight off its presence column
+class Presence(Collection):
+
+  present: bytearray | PagedBytes
+  count: int
+  size: int
+
+  def __init__(self, present: bytearray | PagedBytes, count: int, size: int) -> None:
+    self.present = present
+    self.count = count
+    self.size = size
+
+  def __contains__(self, id: object) -> bool:
+    return isinstance(id, int) and 0 <= id < self.size and self.present[id] == 1
+
+  def __iter__(self) -> Iterator[int]:
+    i = self.present.find(1, 0, self.size)
+    while i != -1:
+      yield i
+      i = self.present.find(1, i + 1, self.size)
+
+  def __len__(self) -> int:
+    return self.count
+
+
+# a DataSystem holding its records in two dense columns indexed by id rather than a dict of boxed ints: a presence byte and a uint64 balance
+#   per id, 9 bytes an id whatever the population; a neighbor lookup is then a single find for a set byte, as in SybilSystem
+#   in a space too wide to preallocate, presence is paged and balances are kept in a dict instead
+class ColumnarDataSystem(DataSystem):
+
+  # present[id] is 1 iff id has a record
+  present: bytearray | PagedBytes
+
+  # balances[id], only meaningful where present[id], either an array, a (snapshot's) memoryview cast to 'Q' or a dict
+  balances: array | memoryview | dict[int, int]
+
+  count: int
+
+  def __init__(self, data: Sequence[Employee], space: IdSpace = DEFAULT_SPACE) -> None:
+    self.space = space
+    self.present = space.bytemap()
+    self.balances = array('Q', bytes(8 * space.size)) if space.dense else dict()
+    for emp in data:
+      self.present[emp.id] = 1
+      self.balances[emp.id] = emp.balance
+    self.count = self.present.count(1)
+
+  # a ColumnarDataSystem over existing columns, such as those of a snapshot
+  @classmethod
+  def over(cls, present: bytearray, balances: array | memoryview, space: IdSpace = DEFAULT_SPACE) -> 'ColumnarDataSystem':
+    ds = cls.__new__(cls)
+    ds.space = space
+    ds.present = present
+    ds.balances = balances
+    ds.count = present.count(1)
+    return ds
+
+  def try_retrieve(self, employee_id: int, bound: int) -> int | None:
+    if bound >= 0:
+      i = self.present.find(1, employee_id, min(employee_id + bound + 1, self.space.size))
+    else:
+      i = self.present.rfind(1, max(employee_id + bound, 0), employee_id + 1)
+    return i if i != -1 else None
+
+  def find(self, employee_id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int]:
+    if self.present[employee_id]:
+      return (DataStatus.CASE1, employee_id, self.balances[employee_id])
+    if (target := self.try_retrieve(employee_id, self.space.radius)) != None:
+      return (DataStatus.CASE2, target, self.balances[target])
+    if (target := self.try_retrieve(employee_id, -self.space.radius)) != None:
+      return (DataStatus.CASE3, target, self.balances[target])
+    return (DataStatus.FAIL, )
+
+  def give(self, case: DataStatus, employee_id: int, p: int):
+    self.balances[employee_id] += share(case, p)
+
+  def set(self, employee_id: int, p: int):
+    self.count += not self.present[employee_id]
+    self.present[employee_id] = 1
+    self.balances[employee_id] = p
+
+  def query(self, employee_id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int]:
+    return (DataStatus.OK, self.balances[employee_id]) if self.present[employee_id] else (DataStatus.FAIL, )
+
+  def clear(self, employee_id: int):
+    LOG.debug("destroying record for id:%d", employee_id)
+    assert self.present[employee_id]
+    self.present[employee_id] = 0
+    self.count -= 1
+    return self.balances[employee_id]
+
+  def scan(self, low: int, high: int) -> List[Tuple[int, int]]:
+    ret = []
+    i = self.present.find(1, low, high + 1)
+    while i != -1:
+      ret.append((i, self.balances[i]))
+      i = self.present.find(1, i + 1, high + 1)
+    return ret
+
+  def members(self) -> Presence:
+    return Presence(self.present, self.count, self.space.size)
+
+  def records(self) -> List[Tuple[int, int]]:
+    return [(id, self.balances[id]) for id in self.members()]
+
+  def find_many(self, ids: List[int]) -> List[Tuple]:
+    (present, balances, find) = (self.present, self.balances, self.find)
+    return [(DataStatus.CASE1, id, balances[id]) if present[id] else find(id) for id in ids]
+
+  def query_many(self, ids: List[int]) -> List[Tuple]:
+    (present, balances) = (self.present, self.balances)
+    return [(DataStatus.OK, balances[id]) if present[id] else (DataStatus.FAIL, ) for id in ids]
+
+  def give_many(self, gives: List[Tuple[DataStatus, int, int]]):
+    balances = self.balances
+    for (case, id, p) in gives:
+      balances[id] += p if case == DataStatus.CASE1 else share(case, p)
+
+  # take the commands one after another straight on the columns, clearing each record taken before the next command looks
+  def take_many(self, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+    (present, balances, find, results) = (self.present, self.balances, self.find, [])
+    for (control, id) in cmds:
+      if control == ControlStatus.FIND:
+        result = (DataStatus.CASE1, id, balances[id]) if present[id] else find(id)
+        target = result[1] if result[0] != DataStatus.FAIL else None
+      else:
+        result = (DataStatus.OK, balances[id]) if present[id] else (DataStatus.FAIL, )
+        target = id if present[id] else None
+      if target != None:
+        present[target] = 0
+        self.count -= 1
+      results.append(result)
+    return results
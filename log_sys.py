@@ -0,0 +1,103 @@
+# this class is the leveled log every system writes its chatter to, in place of printing to stdout and stderr
+#   a message is a %-style format and its arguments, formatted only once it passes the level, e.g. LOG.debug("found %s", result)
+#   the methods of the levels below the current one are bound to a no-op, so a disabled call costs the call itself and nothing else;
+#   arguments that are costly to compute in their own right are guarded by `if LOG.debugging:`
+#   emitted lines collect in a buffer written to the sink in one go whenever it fills, on flush and at exit
+#   the level is taken from the CS145_LOG environment variable (debug, info, warn, error or off) and defaults to warn
+
+import atexit
+import contextlib
+import os
+import sys
+import threading
+from typing import List, TextIO
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warn': WARN, 'error': ERROR, 'off': OFF}
+
+# a no-op standing in for the methods of disabled levels
+def drop(fmt: str, *args):
+  pass
+
+
+class LogSystem:
+
+  level: int
+
+  # whether debug messages are emitted, for guarding costly arguments
+  debugging: bool
+
+  # where lines go when flushed, sys.stderr as it stands at the time of the flush if None, so that redirecting stderr still applies
+  sink: TextIO | None
+
+  lines: List[str]
+
+  # characters buffered and the count at which they are flushed
+  size: int
+  capacity: int
+
+  # the nodes' lookups may log from several threads at once
+  lock: threading.Lock
+
+  def __init__(self, level: int = WARN, sink: TextIO | None = None, capacity: int = 1 << 16) -> None:
+    self.lines = []
+    self.size = 0
+    self.capacity = capacity
+    self.lock = threading.Lock()
+    self.level = level
+    self.sink = sink
+    self.configure(level, sink)
+
+  # change the level, the sink or both, flushing what was logged so far to the old sink first
+  def configure(self, level: int | None = None, sink: TextIO | None = None):
+    self.flush()
+    self.level = level if level != None else self.level
+    self.sink = sink if sink != None else self.sink
+    self.debugging = self.level <= DEBUG
+    self.debug = self.emitter(DEBUG)
+    self.info = self.emitter(INFO)
+    self.warn = self.emitter(WARN)
+    self.error = self.emitter(ERROR)
+
+  # lines logged within the context go to sink, and to the previous sink again after it, a sink of None leaving it as it is
+  @contextlib.contextmanager
+  def redirect(self, sink: TextIO | None):
+    previous = self.sink
+    self.configure(sink=sink)
+    try:
+      yield
+    finally:
+      self.flush()
+      self.sink = previous
+
+  def emitter(self, level: int):
+    if level < self.level:
+      return drop
+    return lambda fmt, *args: self.emit(fmt % args if args else fmt)
+
+  def emit(self, line: str):
+    with self.lock:
+      self.lines.append(line)
+      self.size += len(line) + 1
+      if self.size < self.capacity:
+        return
+    self.flush()
+
+  # write every buffered line out to the sink
+  def flush(self):
+    with self.lock:
+      if not self.lines:
+        return
+      (lines, self.lines, self.size) = (self.lines, [], 0)
+      sink = self.sink if self.sink != None else sys.stderr
+      sink.write('\n'.join(lines) + '\n')
+      sink.flush()
+
+
+LOG = LogSystem(LEVELS[os.environ.get('CS145_LOG', 'warn').lower()])
+atexit.register(LOG.flush)
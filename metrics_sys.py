@@ -0,0 +1,102 @@
+# this class collects counters, timers and latency histograms from the other systems and exports them as JSON on termination
+#   systems hold a MetricsSystem and report into it unconditionally, the disabled NullMetrics turns every report into a no-op call;
+#   reports whose names would have to be built per call are guarded by `if metrics.enabled:` or use names built up front
+
+import json
+import sys
+import threading
+import time
+
+class MetricsSystem:
+
+  enabled = True
+
+  # where the JSON export goes on terminate, stderr if None
+  path: str | None
+
+  counters: dict[str, int]
+
+  # accumulated seconds per timer
+  timers: dict[str, float]
+
+  # per histogram, the count of observations whose latency in microseconds has bit length i, i.e. falls in [2^(i-1), 2^i)
+  histograms: dict[str, list[int]]
+
+  # the master's lookups report from its executor threads as well as its own
+  lock: threading.Lock
+
+  def __init__(self, path: str | None = None) -> None:
+    self.path = path
+    self.lock = threading.Lock()
+    self.counters = dict()
+    self.timers = dict()
+    self.histograms = dict()
+
+  # the current time in seconds, only meaningful as a difference
+  def clock(self) -> float:
+    return time.perf_counter()
+
+  def count(self, name: str, n: int = 1):
+    with self.lock:
+      self.counters[name] = self.counters.get(name, 0) + n
+
+  def add_time(self, name: str, seconds: float):
+    with self.lock:
+      self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+  # record a latency both in the named timer and in the named histogram
+  def observe(self, name: str, seconds: float):
+    with self.lock:
+      self.timers[name] = self.timers.get(name, 0.0) + seconds
+      buckets = self.histograms.setdefault(name, [0] * 32)
+      buckets[min(int(seconds * 1e6).bit_length(), 31)] += 1
+
+  def export(self) -> dict:
+    with self.lock:
+      return {
+        'counters': dict(self.counters),
+        'timers_s': dict(self.timers),
+        'histograms_us': dict([(name, {
+          'count': sum(buckets),
+          'buckets': dict([(f"<{1 << i}", n) for (i, n) in enumerate(buckets) if n]),
+        }) for (name, buckets) in self.histograms.items()]),
+      }
+
+  # write the export out
+  def terminate(self):
+    if self.path == None:
+      json.dump(self.export(), sys.stderr, indent=2)
+      print(file=sys.stderr)
+      return
+    with open(self.path, 'w') as f:
+      json.dump(self.export(), f, indent=2)
+
+
+# a MetricsSystem that records nothing, the default for every system
+class NullMetrics(MetricsSystem):
+
+  enabled = False
+
+  def __init__(self) -> None:
+    pass
+
+  def clock(self) -> float:
+    return 0.0
+
+  def count(self, name: str, n: int = 1):
+    pass
+
+  def add_time(self, name: str, seconds: float):
+    pass
+
+  def observe(self, name: str, seconds: float):
+    pass
+
+  def export(self) -> dict:
+    return dict()
+
+  def terminate(self):
+    pass
+
+
+NULL_METRICS = NullMetrics()
@@ -13,33 +13,100 @@
 #   remains in the initial bounds
 
 from enum import Enum
-import sys
+import contextlib
+import itertools
 import time
-from comms_sys import CommSystem
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from cache_sys import PlacementPolicy, ResolutionCache
+from comms_sys import BATCH_MAX, CommSystem, range_fits
 from cs145lib.task2.utils import Employee
 from cs145lib.task2 import Channel
 from data_sys import DataStatus, DataSystem
-from typing import List, Sequence, Tuple
+from log_sys import LOG
+from metrics_sys import NULL_METRICS, MetricsSystem
+from part_sys import PartitionedDataSystem
+from snap_sys import Snapshotter
+from space_sys import DEFAULT_SPACE, IdSpace, PagedBytes
+from trace_sys import TraceRecorder
+from typing import Iterable, List, Sequence, Tuple
 from status import ControlStatus, CommStatus, SybilStatus
 
+# swaps 0 and 1 bytes
+INVERT = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+# the names commands are timed under, built once rather than on every command
+OP_METRICS: dict[ControlStatus, str] = dict([(control, f"op.{control.name}") for control in ControlStatus])
+
+# the names lookups are timed under, by the class of the source looked up, filled in as classes are met
+SEARCH_METRICS: dict[type, str] = dict()
+
+def search_metric(source: DataSystem) -> str:
+  if (name := SEARCH_METRICS.get(type(source))) == None:
+    name = SEARCH_METRICS[type(source)] = f"search.{type(source).__name__}"
+  return name
+
 # this class is a node subsystem that will use data gathered from MasterNode's results to predict the results of future queries without needing to refer to 
 #   actual data sources
 class SybilSystem:
   
-  record: dict[int, SybilStatus]
+  # ids are recorded as two parallel byte-per-id arrays, an id is WHTE if white[id], else BLCK if black[id], else GREY
+  #   black is kept clear wherever white is set so that "is anything in this window not black" is a single find for a zero byte
+  #   both are paged in a space too wide to preallocate
+  white: bytearray | PagedBytes
+  black: bytearray | PagedBytes
   control: ControlStatus
+  metrics: MetricsSystem
+  space: IdSpace
+  
+  # whether white and black came from a snapshot rather than being learnt this run
+  restored: bool
   
-  def __init__(self) -> None:
+  def __init__(self, metrics: MetricsSystem = NULL_METRICS, space: IdSpace = DEFAULT_SPACE) -> None:
     
     # initialize records as GREY
-    self.record = dict([(i, SybilStatus.GREY) for i in range(65535 + 1)])
+    self.white = space.bytemap()
+    self.black = space.bytemap()
+    self.restored = False
+    self.metrics = metrics
+    self.space = space
+    
+  def status(self, id: int) -> SybilStatus:
+    return SybilStatus.WHTE if self.white[id] else SybilStatus.BLCK if self.black[id] else SybilStatus.GREY
     
   def mark_white(self, id: int):
-    self.record[id] = SybilStatus.WHTE
+    self.white[id] = 1
+    self.black[id] = 0
   
   # only mark black if the record was not white prior
   def mark_black(self, id: int):
-    self.record[id] = SybilStatus.BLCK if self.record[id] != SybilStatus.WHTE else SybilStatus.WHTE
+    self.black[id] = 0 if self.white[id] else 1
+  
+  # replace everything known with the exact membership of the whole id space, presence[id] being 1 iff some node holds id
+  def warm_start(self, presence: bytearray | PagedBytes):
+    self.white = presence
+    self.black = presence.translate(INVERT)
+  
+  # pick up where a previous run left off
+  def restore(self, white: bytearray | PagedBytes, black: bytearray | PagedBytes):
+    self.white = white
+    self.black = black
+    self.restored = True
+  
+  # learn the exact membership of the window [low, high], present being every id in it that some node holds
+  def learn_window(self, low: int, high: int, present: List[int]):
+    self.mark_black_range(low, high + 1)
+    [self.mark_white(id) for id in present]
+  
+  # mark every id in range(start, stop) black in bulk, then restore the (few) white ids the slice overwrote
+  def mark_black_range(self, start: int, stop: int):
+    if start >= stop:
+      return
+    self.black[start:stop] = b'\x01' * (stop - start)
+    i = self.white.find(1, start, stop)
+    while i != -1:
+      self.black[i] = 0
+      i = self.white.find(1, i + 1, stop)
     
   def set_control(self, new_control: ControlStatus):
     self.control = new_control
@@ -58,17 +125,17 @@ class SybilSystem:
       # mark [id, bounds] black
       case DataStatus.CASE2:
         self.mark_white(bounds)
-        [self.mark_black(i) for i in range(id, bounds)]
+        self.mark_black_range(id, bounds)
         
-      # mark [id, id + 100] black and mark [bounds + 1, id] black
+      # mark [id, id + radius] black and mark [bounds + 1, id] black
       case DataStatus.CASE3:
         self.mark_white(bounds)
-        [self.mark_black(i) for i in range(id, min(id + 100 + 1, 65535))]
-        [self.mark_black(i) for i in range(bounds + 1, id)]
+        self.mark_black_range(id, self.space.window(id)[1] + 1)
+        self.mark_black_range(bounds + 1, id)
         
       case DataStatus.FAIL:
-        [self.mark_black(i) for i in range(id, min(id + 100 + 1, 65535))]
-        [self.mark_black(i) for i in range(max(id - 100, 0), id)]
+        (low, high) = self.space.window(id)
+        self.mark_black_range(low, high + 1)
   
   def interpret_query(self, dataStatus: DataStatus, id: int):
     match dataStatus:
@@ -80,21 +147,23 @@ class SybilSystem:
   # predict the results of a given command on a given id (FALSE = not worth trying, do not proceed; TRUE = worth trying, proceed)
   def predict_id(self, operation_no: int, id: int) -> bool:
     dream = self.predict_give(id) if self.control == ControlStatus.GIVE else self.predict_query(id)
-    print(f"#:{operation_no} > IT WAS REVEALED TO ME IN A DREAM: {dream}", file=sys.stderr)
+    self.metrics.count('sybil.proceed' if dream else 'sybil.skip')
+    LOG.debug("#:%d > IT WAS REVEALED TO ME IN A DREAM: %s", operation_no, dream)
     return dream
   
   # check if ANY value in the checking range is not black, if so proceed; if not preemptively fail
   def predict_give(self, id: int) -> bool:
-    return any([self.record[i] != SybilStatus.BLCK for i in range(max(id - 100, 0), min(id + 100 + 1, 65535))])
+    (low, high) = self.space.window(id)
+    return self.black.find(0, low, high + 1) != -1
   
   # check if the id itself is black
   def predict_query(self, id: int) -> bool:
-    return self.record[id] != SybilStatus.BLCK
+    return not self.black[id]
   
   # terminate and show a copy of the records for post-mortem
   def terminate(self):
-    print("~~~ DELPHI BURNS | MY JOB IS FINISHED | APOLLO CALLS ME HOME ~~~", file=sys.stderr)
-    # [print(f"{key}: {val}", file=sys.stderr) for (key, val) in list(self.record.items())]
+    LOG.info("~~~ DELPHI BURNS | MY JOB IS FINISHED | APOLLO CALLS ME HOME ~~~")
+    # [LOG.debug("%d: %s", i, self.status(i)) for i in range(len(self.white))]
 
 
 class MasterNode:
@@ -103,86 +172,336 @@ class MasterNode:
   sources: List[DataSystem]
   control: ControlStatus
   sybil: SybilSystem
+  
+  # when set, the remote sources are searched speculatively on these threads while sources[0] is searched locally
+  executor: ThreadPoolExecutor | None
+  
+  # the command last searched and the speculative lookups its search did not wait for, settled once its reply is out
+  unsettled: Tuple[Tuple, List[Future]] | None
+  
+  # slave sources that have been fully replicated into sources[0], they are no longer searched but still need terminating
+  retired: List[DataSystem]
+  
+  metrics: MetricsSystem
+  
+  # past resolutions of commands, None unless a resolution_cache size was given
+  resolution: ResolutionCache | None
+  
+  # which records stay on the master, None unless a capacity was given, in which case cold records are written back to their shard
+  placement: PlacementPolicy | None
+  
+  # whether GIVE pulls the whole window from the slaves with FIND_RANGE and resolves it locally
+  #   only for spaces whose windows are at most 256 ids wide, as FIND_RANGE replies give ids as byte offsets into the window
+  range_scan: bool
+  
+  # how many commands operate handles, None to stream commands until the judge ends the stream with TERM or an empty frame
+  operations: int | None
+  
+  # where operate sends the log, see log_sys, or None to leave it on its current sink
+  log_path: str | None
+  
+  # if set, sources[0] and the Sybil arrays are restored from its snapshot on start and saved back to it on shutdown
+  snapshotter: Snapshotter | None
+  
+  # if set, every frame on the judge link ('judge') and the slave links ('slave1', ...) is traced, stamped with its operation number
+  recorder: TraceRecorder | None
+  
+  # the space of the judge's commands, which the sources must share
+  space: IdSpace
 
   # we assume sources[0] is the master source
-  def __init__(self, chan: Channel, sources: List[DataSystem]) -> None:
-    self.comms = CommSystem(chan, CommStatus.SUB, CommStatus.CMD)
+  def __init__(self, chan: Channel, sources: List[DataSystem], concurrent: bool = False, metrics: MetricsSystem = NULL_METRICS,
+               resolution_cache: int = 0, capacity: int | None = None, range_scan: bool = False, operations: int | None = 1000,
+               log_path: str | None = None, snapshotter: Snapshotter | None = None, recorder: TraceRecorder | None = None,
+               space: IdSpace = DEFAULT_SPACE) -> None:
+    if range_scan and not range_fits(space):
+      raise ValueError(f"range_scan needs a window of at most 256 ids, a radius of {space.radius} spans {2 * space.radius + 1}")
+    self.comms = CommSystem(chan, CommStatus.SUB, CommStatus.CMD, space)
     self.sources = sources
-    self.sybil = SybilSystem()
+    self.metrics = metrics
+    self.space = space
+    self.resolution = ResolutionCache(resolution_cache, space.radius) if resolution_cache > 0 else None
+    self.placement = PlacementPolicy(capacity) if capacity != None else None
+    if capacity != None:
+      for source in sources[1:]:
+        if isinstance(source, SlaveDriver):
+          source.writes_back = True
+    self.range_scan = range_scan
+    self.operations = operations
+    self.log_path = log_path
+    self.sybil = SybilSystem(metrics, space)
+    self.snapshotter = snapshotter
+    if snapshotter != None and (snap := snapshotter.restore()) != None:
+      self.sources[0] = snap.data
+      if snap.white != None and snap.black != None:
+        self.sybil.restore(snap.white, snap.black)
+    elif snapshotter != None:
+      snapshotter.save(self.sources[0])
+    self.comms.instrument(metrics, 'judge')
+    [source.instrument(metrics, f"slave{i}") for (i, source) in enumerate(sources) if isinstance(source, SlaveDriver)]
+    self.recorder = recorder
+    if recorder != None:
+      recorder.people(self.sources[0].records())
+      self.comms.chan = recorder.wrap(self.comms.chan, 'judge')
+      for (i, source) in enumerate(sources):
+        if isinstance(source, SlaveDriver):
+          source.comms.chan = recorder.wrap(source.comms.chan, f"slave{i}")
+    self.retired = []
+    self.executor = ThreadPoolExecutor(max_workers=len(sources) - 1) if concurrent and len(sources) > 1 else None
+    self.unsettled = None
   
-  # this method starts the master node operation loop
+  # this method starts the master node operation loop, then terminates every party once the commands run out
   def operate(self):
-    for operation_no in range(1, 1000 + 1):
+    with open(self.log_path, 'w') if self.log_path != None else contextlib.nullcontext() as log, LOG.redirect(log):
+      try:
+        self.run(range(1, self.operations + 1) if self.operations != None else itertools.count(1))
+        self.shutdown()
+      finally:
+        if self.recorder != None:
+          self.recorder.close()
+  
+  # handle one command per operation number, stopping early at the end of the stream
+  #   nothing here grows with the number of operations, every structure touched is bounded by the id space or a configured capacity
+  def run(self, operation_nos: Iterable[int]):
+    for operation_no in operation_nos:
+      if self.recorder != None:
+        self.recorder.mark(operation_no)
       cmd = self.comms.receive()
+      start = self.metrics.clock()
       assert isinstance(cmd, Tuple)
+      if cmd[0] == ControlStatus.TERM:
+        break
 
       self.set_control(cmd[0])
       self.comms.set_control(cmd[0])
       self.sybil.set_control(cmd[0])
       
-      print(f"### OPERATION {operation_no}: {cmd} ###", file=sys.stderr)
+      LOG.debug("### OPERATION %d: %s ###", operation_no, cmd)
       
-      result = self.search_sources(cmd, operation_no) if self.sybil.predict_id(operation_no, cmd[1]) else (DataStatus.FAIL, )
+      if (result := self.recall(cmd)) != None:
+        pass
+      elif self.sybil.predict_id(operation_no, cmd[1]):
+        result = self.search_sources(cmd, operation_no)
+        if result[0] == DataStatus.FAIL:
+          self.metrics.count('sybil.wasted')
+      else:
+        result = (DataStatus.FAIL, )
+      
+      if self.resolution != None:
+        self.resolution.put(cmd[0], cmd[1], result[0], result[1] if self.control == ControlStatus.GIVE and result[0] != DataStatus.FAIL else None)
       
       # if the control status is give, give the money to the cached data PROVIDED that the operation did not fail
       if self.control == ControlStatus.GIVE and result[0] != DataStatus.FAIL:
-        print(f"#:{operation_no} giving {result[1]} {cmd[2]}, with bal {self.sources[0].query(result[1])} for {result[1]}")
+        if LOG.debugging:
+          LOG.debug("#:%d giving %d %d, with bal %s for %d", operation_no, result[1], cmd[2], self.sources[0].query(result[1]), result[1])
         self.sources[0].give(result[0], result[1], cmd[2])
-        print(f"  new bal is {self.sources[0].query(result[1])} for {result[1]}")
+        if LOG.debugging:
+          LOG.debug("  new bal is %s for %d", self.sources[0].query(result[1]), result[1])
       
       self.comms.send(result)
+      self.settle()
+      
+      # keep the master within capacity, off the latency path of this command
+      if self.placement != None:
+        used = None if result[0] == DataStatus.FAIL else result[1] if self.control == ControlStatus.GIVE else cmd[1]
+        if used != None:
+          self.placement.touch(used)
+        self.evict(used)
       
-    # upon completion of operations, terminate all DataSystems
-    [ds.terminate() for ds in self.sources]
+      self.metrics.observe(OP_METRICS[self.control], self.metrics.clock() - start)
+  
+  # upon completion of operations, terminate all DataSystems
+  def shutdown(self):
+    if self.executor != None:
+      self.executor.shutdown()
+    if self.snapshotter != None:
+      self.snapshotter.save_sybil(self.sybil.white, self.sybil.black)
+    [ds.terminate() for ds in self.sources + self.retired]
     self.sybil.terminate()
-    
-    return
+    if self.resolution != None:
+      self.metrics.count('resolution.hits', self.resolution.hits)
+      self.metrics.count('resolution.misses', self.resolution.misses)
+      self.metrics.count('resolution.invalidations', self.resolution.invalidations)
+    self.metrics.terminate()
+  
+  # pull every record held by the slave sources into sources[0] before operating, after which no command needs a slave round trip
+  #   returns the total bytes transferred
+  def replicate(self) -> int:
+    total = 0
+    for source in self.sources[1:]:
+      assert isinstance(source, SlaveDriver)
+      records, nbytes = source.replicate()
+      [self.cache_record(id, p) for (id, p) in records]
+      total += nbytes
+      self.retired.append(source)
+    self.sources = self.sources[:1]
+    if self.executor != None:
+      self.executor.shutdown()
+      self.executor = None
+    return total
+  
+  # rebuild the result of a command from its cached resolution, reading the balance live, or None if there is none
+  #   every resolved target lives in sources[0] since slave hits are always cached there
+  def recall(self, cmd: Tuple) -> Tuple | None:
+    if self.resolution == None or (cached := self.resolution.get(cmd[0], cmd[1])) == None:
+      return None
+    (status, target) = cached
+    if status == DataStatus.FAIL:
+      return (DataStatus.FAIL, )
+    if self.control == ControlStatus.GIVE:
+      return (status, target, self.sources[0].query(target)[1])
+    return (status, self.sources[0].query(cmd[1])[1])
   
   def search_sources(self, cmd: Tuple, operation_no: int) -> Tuple:
     
     result: Tuple = (DataStatus.FAIL, )
     
+    # only the slave sources whose ids could answer the command are consulted
+    sources = self.route(cmd)
+    
+    if self.range_scan and self.control == ControlStatus.GIVE:
+      return self.search_window(cmd, sources, operation_no)
+    
+    # in concurrent mode every remote lookup is already in flight before the local one starts
+    pending: dict[DataSystem, Future] = self.speculate(sources, cmd[1])
+    
     # check every source, terminate if there's an exact match
-    for source in self.sources:
+    for source in sources:
       
-      temp = source.find(cmd[1]) if self.control == ControlStatus.GIVE else source.query(cmd[1])
+      temp = pending.pop(source).result() if source in pending else self.lookup(source, cmd[1])
       
       # if the result from a slave node was not a FAIL, cache the result in the data since we destroy the original slave data no matter what
-      if source != self.sources[0] and temp[0] != DataStatus.FAIL:
-        if self.control == ControlStatus.GIVE:
-          self.cache_record(temp[1], temp[2])
-        else:
-          self.cache_record(cmd[1], temp[1])
+      if source != self.sources[0]:
+        self.cache_result(cmd, temp)
       
-      print(f"#:{operation_no} source {source} found {temp}")
+      LOG.debug("#:%d source %s found %s", operation_no, source, temp)
       
       assert isinstance(temp, Tuple)
       assert isinstance(result, Tuple)
       
       # if the temporary result is already OK, accept it and carry on
-      if (temp[0] == DataStatus.CASE1 and self.control == ControlStatus.GIVE) or (temp[0] == DataStatus.OK and self.control == ControlStatus.QUERY):
+      if self.exact(temp):
         result = temp
         break
       
-      # if the temporary result is 'better' than the current result (*both of them must be CASEx results*)
-      if temp[0] in range(30, 35) and result[0] in range(30, 35):
-        result = temp if temp[0].value < result[0].value else result
-      
-      result = self.better_result(result, temp)
+      result = self.combine(result, temp)
+    
+    # speculative lookups the loop never got to have destroyed their slave records all the same, so they must be cached too,
+    #   though not before the reply goes out, see settle
+    if pending:
+      self.unsettled = (cmd, list(pending.values()))
     
     # have the sybil interpret the result to learn
     self.sybil.interpret_result(result[0], cmd[1], result[1] if (self.control == ControlStatus.GIVE and result[0] != DataStatus.FAIL) else None)
     
     return result
   
+  # resolve a GIVE by moving every slave record in its window onto the master, where the local find is then exact
+  #   the window's full membership is known at that point, so Sybil learns all of it at once
+  def search_window(self, cmd: Tuple, sources: List[DataSystem], operation_no: int) -> Tuple:
+    (low, high) = self.space.window(cmd[1])
+    start = self.metrics.clock()
+    remotes = [source for source in sources[1:] if isinstance(source, SlaveDriver)]
+    if self.executor != None:
+      windows = [future.result() for future in [self.executor.submit(source.find_range, cmd[1]) for source in remotes]]
+    else:
+      windows = [source.find_range(cmd[1]) for source in remotes]
+    self.metrics.add_time('search.SlaveDriver', self.metrics.clock() - start)
+    
+    [self.cache_record(id, p) for window in windows for (id, p) in window]
+    result = self.lookup(self.sources[0], cmd[1])
+    LOG.debug("#:%d window [%d, %d] resolved to %s", operation_no, low, high, result)
+    
+    self.sybil.learn_window(low, high, [id for (id, _) in self.sources[0].scan(low, high)])
+    return result
+  
+  # cache the records taken by the speculative lookups the last search did not wait for, before the slave links are used again
+  def settle(self):
+    if self.unsettled == None:
+      return
+    (cmd, futures) = self.unsettled
+    self.unsettled = None
+    [self.cache_result(cmd, future.result()) for future in futures]
+  
+  # look id up on one source, timing it under the source's class name (DataSystem vs SlaveDriver)
+  def lookup(self, source: DataSystem, id: int) -> Tuple:
+    if not self.metrics.enabled:
+      return source.find(id) if self.control == ControlStatus.GIVE else source.query(id)
+    start = self.metrics.clock()
+    ret = source.find(id) if self.control == ControlStatus.GIVE else source.query(id)
+    self.metrics.add_time(search_metric(source), self.metrics.clock() - start)
+    return ret
+  
+  # write the coldest master records back to the slaves owning them, if the master is over capacity
+  #   records no slave source owns (e.g. after replicate) stay put, as does keep, the id the current command resolved to
+  def evict(self, keep: int | None = None):
+    assert self.placement != None
+    for id in self.placement.victims(self.sources[0].members(), keep):
+      owners = [source for source in self.sources[1:] if isinstance(source, SlaveDriver) and id in source.ids]
+      if not owners:
+        continue
+      assert owners[0].comms.compact, "write-back needs a compact link, negotiate after constructing the MasterNode"
+      p = self.sources[0].clear(id)
+      owners[0].store(id, p)
+      if self.resolution != None:
+        self.resolution.invalidate(id)
+      self.metrics.count('placement.evictions')
+  
+  # learn the exact membership of every source before the first command so Sybil turns away misses without paying for them
+  #   only balances stay behind, the slaves send just run-length encoded id sets
+  #   Sybil arrays restored from a snapshot already know at least as much, so they are kept
+  def warm_start(self):
+    if self.sybil.restored:
+      return
+    presence = self.space.bytemap()
+    for id in self.sources[0].members():
+      presence[id] = 1
+    for source in self.sources[1:]:
+      assert isinstance(source, SlaveDriver)
+      for run in source.membership():
+        presence[run.start:run.stop] = b'\x01' * len(run)
+    self.sybil.warm_start(presence)
+  
+  # sources[0] followed by the slave sources owning ids the command can resolve to: the id itself for QUERY, its window for GIVE
+  def route(self, cmd: Tuple) -> List[DataSystem]:
+    (low, high) = self.space.window(cmd[1]) if self.control == ControlStatus.GIVE else (cmd[1], cmd[1])
+    return self.sources[:1] + [source for source in self.sources[1:] if not isinstance(source, SlaveDriver) or source.overlaps(low, high)]
+  
+  # issue the lookup on every remote source among sources in the background, returning nothing unless in concurrent mode
+  #   route leaves a single lookup per source, so there is nothing here to batch
+  def speculate(self, sources: List[DataSystem], id: int) -> dict[DataSystem, Future]:
+    if self.executor == None:
+      return {}
+    return dict([(source, self.executor.submit(self.lookup, source, id)) for source in sources[1:]])
+  
+  # cache a non-FAIL result returned by a slave source
+  def cache_result(self, cmd: Tuple, temp: Tuple):
+    if temp[0] == DataStatus.FAIL:
+      return
+    if self.control == ControlStatus.GIVE:
+      self.cache_record(temp[1], temp[2])
+    else:
+      self.cache_record(cmd[1], temp[1])
+  
+  # whether a result settles the command outright, so no other source needs asking
+  def exact(self, temp: Tuple) -> bool:
+    return (temp[0] == DataStatus.CASE1 and self.control == ControlStatus.GIVE) or (temp[0] == DataStatus.OK and self.control == ControlStatus.QUERY)
+  
+  # fold the result of one more source into the best result so far
+  def combine(self, result: Tuple, temp: Tuple) -> Tuple:
+    # if the temporary result is 'better' than the current result (*both of them must be CASEx results*)
+    if temp[0] in range(30, 35) and result[0] in range(30, 35):
+      result = temp if temp[0].value < result[0].value else result
+    return self.better_result(result, temp)
+  
   # return the best result tuple from the input result tuples
   def better_result(self, tup1: Tuple, tup2: Tuple) -> Tuple:
     
-    print(f"comparing {tup1} and {tup2}")
+    LOG.debug("comparing %s and %s", tup1, tup2)
     
     # if they are not equal in case level, return the smaller valued tuple
     if tup1[0] != tup2[0]:
-      print(f"comparing {tup1[0].value} and {tup2[0].value}")
+      LOG.debug("comparing %d and %d", tup1[0].value, tup2[0].value)
       return min([tup1, tup2], key=lambda x: x[0].value)
     
     match tup1[0]:
@@ -201,21 +520,46 @@ class MasterNode:
     
   # provided data about a slave record, cache it into our own data
   def cache_record(self, id: int, p: int):
-    print(f"caching new record (id:{id}, p:{p})")
+    LOG.debug("caching new record (id:%d, p:%d)", id, p)
     self.sources[0].set(id, p)
+    if self.resolution != None:
+      self.resolution.invalidate(id)
     return (id, p)
       
   def set_control(self, new_control: ControlStatus):
     self.control = new_control
 
 
+# split the id space into n contiguous ranges of near equal size, one per shard
+def shard_ranges(n: int, space: IdSpace = DEFAULT_SPACE) -> List[range]:
+  bounds = [i * space.size // n for i in range(n + 1)]
+  return [range(bounds[i], bounds[i + 1]) for i in range(n)]
+
+
 class SlaveDriver(DataSystem):
 
   comms: CommSystem
   control: ControlStatus
+  
+  # the ids the driven node holds records for, the master routes nothing outside of it here
+  ids: range
+  
+  # set by a MasterNode with a capacity, whose STOREs write back balances that may outgrow the fixed reply layouts,
+  #   so that the link is negotiated compact
+  writes_back: bool = False
 
-  def __init__(self, chan: Channel) -> None:
-    self.comms = CommSystem(chan, CommStatus.CMD, CommStatus.DAT)
+  # ids defaults to the whole space
+  def __init__(self, chan: Channel, ids: range | None = None, space: IdSpace = DEFAULT_SPACE) -> None:
+    self.comms = CommSystem(chan, CommStatus.CMD, CommStatus.DAT, space)
+    self.ids = ids if ids != None else range(space.size)
+    self.space = space
+  
+  # whether any id in [low, high] belongs to this shard
+  def overlaps(self, low: int, high: int) -> bool:
+    return low < self.ids.stop and high >= self.ids.start
+  
+  def instrument(self, metrics: MetricsSystem, name: str):
+    self.comms.instrument(metrics, name)
 
   # drive the node to execute the find command
   def find(self, id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int, int]:
@@ -228,6 +572,78 @@ class SlaveDriver(DataSystem):
     self.comms.set_control(ControlStatus.QUERY)
     self.comms.send( (ControlStatus.QUERY, id) )
     return self.comms.receive()
+  
+  # drive the node to execute several (control, id) lookups, BATCH_MAX per frame, and return their results in order
+  #   MasterNode never has two lookups for one node at hand: the judge only sends a command once the last is answered and route gives
+  #   each command at most one lookup per node, so nothing in the master emits BATCH; it is for callers holding many ids at once
+  def batch(self, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+    results = []
+    for i in range(0, len(cmds), BATCH_MAX):
+      chunk = cmds[i:i + BATCH_MAX]
+      self.comms.set_control(ControlStatus.BATCH)
+      self.comms.send(chunk)
+      results.extend(self.comms.receive_batch())
+    return results
+  
+  def find_many(self, ids: List[int]) -> List[Tuple]:
+    return self.batch([(ControlStatus.FIND, id) for id in ids])
+  
+  def query_many(self, ids: List[int]) -> List[Tuple]:
+    return self.batch([(ControlStatus.QUERY, id) for id in ids])
+  
+  # agree on the encoding of the link with the node, which acknowledges with a plain OK before both ends switch over
+  #   the HELO flags are compact [bit 0] and sequenced [bit 1], the window only concerns this end
+  #   a space the fixed-width layouts cannot carry stays compact, as does a link records are written back over
+  def negotiate(self, compact: bool, sequenced: bool = False, window: int = 1):
+    assert 0 < window <= 64
+    compact = compact or not self.comms.fixed or self.writes_back
+    self.comms.set_control(ControlStatus.HELO)
+    self.comms.send( (ControlStatus.HELO, int(compact) | int(sequenced) << 1) )
+    assert self.comms._receive() == bytes([DataStatus.OK.value])
+    self.comms.compact = compact
+    self.comms.sequenced = sequenced
+    self.comms.window = window
+  
+  # drive the node through several (control, id) lookups with up to window of them in flight at once, returning results in order
+  #   without a sequenced link this degrades to one round trip per lookup
+  def pipeline(self, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+    if not self.comms.sequenced:
+      return [self.find(id) if control == ControlStatus.FIND else self.query(id) for (control, id) in cmds]
+    # collect as we go so that no more than window SEQs are ever outstanding, keeping them unique
+    results = []
+    seqs: deque[int] = deque()
+    for cmd in cmds:
+      self.comms.set_control(cmd[0])
+      self.comms.send(cmd)
+      seqs.append(self.comms.last_seq)
+      while len(seqs) >= self.comms.window:
+        results.append(self.comms.collect(seqs.popleft()))
+    while seqs:
+      results.append(self.comms.collect(seqs.popleft()))
+    return results
+  
+  # drive the node to hand over every record in the window around id
+  def find_range(self, id: int) -> List[Tuple[int, int]]:
+    self.comms.set_control(ControlStatus.FIND_RANGE)
+    self.comms.send( (ControlStatus.FIND_RANGE, id) )
+    return self.comms.receive()[1]
+  
+  # hand a record back to the node, which keeps it until it is next found, there is no reply
+  def store(self, id: int, p: int):
+    self.comms.send( (ControlStatus.STORE, id, p) )
+  
+  # drive the node to summarize which ids it holds, returned as runs of consecutive ids
+  def membership(self) -> List[range]:
+    self.comms.set_control(ControlStatus.MEMB)
+    self.comms.send( (ControlStatus.MEMB, 0) )
+    runs, _ = self.comms.receive_bulk(ControlStatus.MEMB)
+    return [range(start, start + length) for (start, length) in runs]
+  
+  # drive the node to hand over its whole dataset, returning the (id, balance) records and the bytes they took on the wire
+  def replicate(self) -> Tuple[List[Tuple[int, int]], int]:
+    self.comms.set_control(ControlStatus.BULK)
+    self.comms.send( (ControlStatus.BULK, 0) )
+    return self.comms.receive_bulk()
     
   # terminate the driven slave node
   def terminate(self):
@@ -239,15 +655,50 @@ class SlaveNode:
   comms: CommSystem
   data: DataSystem
   control: ControlStatus
+  
+  # if set, the records are restored from its snapshot on start and saved back to it on TERM
+  snapshotter: Snapshotter | None
+  
+  # if set, every frame on the master link ('master') is traced, stamped with the number of commands received so far
+  recorder: TraceRecorder | None
+  
+  space: IdSpace
 
-  def __init__(self, data: Sequence[Employee], chan: Channel) -> None:
-    self.comms = CommSystem(chan, CommStatus.DAT, CommStatus.CMD)
-    self.data = DataSystem(data)
+  # backend selects the DataSystem implementation holding the slave's records
+  #   partitions above 1 spreads the records over that many workers, which take the commands of a batch in parallel, see part_sys
+  #   threads picks thread workers, process workers or, if None, whichever runs in parallel on this build; process workers make every
+  #   lone command pay a pipe round trip, so they only pay off for BATCH traffic
+  def __init__(self, data: Sequence[Employee], chan: Channel, backend: type[DataSystem] = DataSystem,
+               snapshotter: Snapshotter | None = None, recorder: TraceRecorder | None = None, space: IdSpace = DEFAULT_SPACE,
+               partitions: int = 1, threads: bool | None = None) -> None:
+    self.recorder = recorder
+    self.space = space
+    self.comms = CommSystem(recorder.wrap(chan, 'master') if recorder != None else chan, CommStatus.DAT, CommStatus.CMD, space)
+    self.snapshotter = snapshotter
+    snap = snapshotter.restore() if snapshotter != None else None
+    self.data = snap.data if snap != None else backend(data, space)
+    if snapshotter != None and snap == None:
+      snapshotter.save(self.data)
+    if partitions > 1:
+      self.data = PartitionedDataSystem.over(self.data, partitions, threads)
+    if recorder != None:
+      recorder.people(self.data.records())
 
-  # this method starts the slave node operation loop
+  # this method starts the slave node operation loop, the trace being closed however it ends
   def operate(self):
+    try:
+      self.serve()
+    finally:
+      if self.recorder != None:
+        self.recorder.close()
+  
+  def serve(self):
+    received = 0
     while True:
       cmd = self.comms.receive()
+      received += 1
+      if self.recorder != None:
+        self.recorder.mark(received)
       
       assert isinstance(cmd, Tuple)
       
@@ -255,27 +706,62 @@ class SlaveNode:
       self.set_control(cmd[0])
       self.comms.set_control(cmd[0])
       
-      target_id = cmd[1]
-      result: Tuple = ()
-      
       # determine the operation to be executed and execute it
       match self.control:
-        case ControlStatus.QUERY:
-          result = self.data.query(target_id)
-        case ControlStatus.FIND:
-          result = self.data.find(target_id)
         case ControlStatus.TERM:
+          self.data.terminate()
+          LOG.flush()
           return
-        
-      print(f"slave found {result}", file=sys.stderr)
-          
-      # wipe the slave data, if it exists
-      if result[0] != DataStatus.FAIL:
-        clear_id = result[1] if self.control == ControlStatus.FIND else target_id
-        self.data.clear(clear_id)
+        case ControlStatus.BULK:
+          self.hand_over()
+          continue
+        case ControlStatus.MEMB:
+          self.summarize()
+          continue
+        case ControlStatus.STORE:
+          self.data.set(cmd[1], cmd[2])
+          continue
+        case ControlStatus.HELO:
+          self.comms.send( (DataStatus.OK, ) )
+          self.comms.compact = bool(cmd[1] & 1) or not self.comms.fixed
+          self.comms.sequenced = bool(cmd[1] & 2)
+          continue
+        case ControlStatus.BATCH:
+          result = self.data.take_many(cmd[1])
+          LOG.debug("slave found %s", result)
+        case _:
+          result = self.execute(self.control, cmd[1])
       
       # send the result of the operation
       self.comms.send(result)
+  
+  # stream the whole dataset to the master and wipe it, as every record now lives on the master
+  def hand_over(self):
+    self.comms.send_bulk(self.data.records())
+    self.data = self.data.empty()
+  
+  # send the master the ids held here as (start, length) runs
+  def summarize(self):
+    self.comms.send_bulk(self.runs(), ControlStatus.MEMB)
+  
+  def runs(self) -> List[Tuple[int, int]]:
+    runs: List[Tuple[int, int]] = []
+    for id in sorted(self.data.members()):
+      if runs and runs[-1][0] + runs[-1][1] == id:
+        runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+      else:
+        runs.append((id, 1))
+    return runs
+  
+  # execute a single QUERY, FIND or FIND_RANGE and wipe the slave data it returns, if it exists
+  def execute(self, control: ControlStatus, target_id: int) -> Tuple:
+    if control == ControlStatus.FIND_RANGE:
+      result = (DataStatus.OK, self.data.scan(*self.space.window(target_id)))
+      [self.data.clear(id) for (id, _) in result[1]]
+    else:
+      result = self.data.take(control, target_id)
+    LOG.debug("slave found %s", result)
+    return result
           
   def set_control(self, new_control: ControlStatus):
     self.control = new_control
@@ -0,0 +1,230 @@
+# this module partitions a slave's records by id range across worker processes, or across threads on a build running without the GIL,
+#   so that the lookups of one batch run on several cores at once
+#   every partition owns a contiguous range of ids and holds the records in it in a DataSystem of its own; the commands of a batch are
+#   grouped by the partition owning their whole window, dispatched to every partition at once and their results put back in request order
+#   a FIND whose window straddles a boundary needs several partitions, so it runs by itself once everything before it in the batch has
+#   completed, which keeps a batch's results those of taking its commands one by one
+#   a lone command gains nothing from the partitions, so it is applied straight on its partition: by the caller's thread with thread
+#   partitions, at the cost of a pipe round trip with process ones
+
+import multiprocessing
+import sys
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Tuple
+from cs145lib.task2 import Employee
+from data_sys import DataSystem, SortedDataSystem
+from log_sys import LOG
+from space_sys import DEFAULT_SPACE, IdSpace
+from status import ControlStatus, DataStatus
+
+# whether threads run Python in parallel, which only a free-threaded build with the GIL turned off does
+def free_threaded() -> bool:
+  return not getattr(sys, '_is_gil_enabled', lambda: True)()
+
+# the result DataSystem.find gives over the union of several DataSystems, from the result of find on each
+def nearest(results: List[Tuple]) -> Tuple:
+  for (case, pick) in ((DataStatus.CASE1, min), (DataStatus.CASE2, min), (DataStatus.CASE3, max)):
+    if found := [result for result in results if result[0] == case]:
+      return pick(found, key=lambda result: result[1])
+  return (DataStatus.FAIL, )
+
+# the loop of a worker process, applying the DataSystem methods it is sent by name to its records until it is sent None
+def work(conn, backend: type[DataSystem], records: List[Tuple[int, int]], space: IdSpace):
+  data = backend([], space)
+  [data.set(id, p) for (id, p) in records]
+  while (request := conn.recv()) != None:
+    (op, args) = request
+    try:
+      conn.send(getattr(data, op)(*args))
+    except Exception as e:
+      conn.send(e)
+  # a worker process leaves without running atexit
+  LOG.flush()
+  conn.close()
+
+
+# a partition held by a worker process and spoken to over a pipe, one request at a time
+class ProcessPartition:
+
+  # workers are spawned rather than forked, as the node forking them may already be running threads
+  context = multiprocessing.get_context('spawn')
+
+  def __init__(self, backend: type[DataSystem], records: List[Tuple[int, int]], space: IdSpace) -> None:
+    (self.conn, there) = self.context.Pipe()
+    self.process = self.context.Process(target=work, args=(there, backend, records, space), daemon=True)
+    self.process.start()
+    there.close()
+
+  # start applying the method op to the partition, whose return value the next call to result gives
+  def submit(self, op: str, *args):
+    self.conn.send((op, args))
+
+  def result(self):
+    ret = self.conn.recv()
+    if isinstance(ret, Exception):
+      raise ret
+    return ret
+
+  # apply the method op to the partition and wait for what it returns
+  def run(self, op: str, *args):
+    self.submit(op, *args)
+    return self.result()
+
+  def close(self):
+    self.conn.send(None)
+    self.process.join()
+    self.conn.close()
+
+
+# a partition held in this process and served by a thread of its own
+class ThreadPartition:
+
+  data: DataSystem
+  executor: ThreadPoolExecutor
+  pending: Future | None
+
+  def __init__(self, backend: type[DataSystem], records: List[Tuple[int, int]], space: IdSpace) -> None:
+    self.data = backend([], space)
+    [self.data.set(id, p) for (id, p) in records]
+    self.executor = ThreadPoolExecutor(1)
+    self.pending = None
+
+  def submit(self, op: str, *args):
+    self.pending = self.executor.submit(getattr(self.data, op), *args)
+
+  def result(self):
+    return self.pending.result()
+
+  # with no other partition to overlap with, the caller's thread applies op itself rather than hand it to the partition's
+  def run(self, op: str, *args):
+    return getattr(self.data, op)(*args)
+
+  def close(self):
+    self.executor.shutdown()
+
+
+class PartitionedDataSystem(DataSystem):
+
+  partitions: List[ProcessPartition | ThreadPartition]
+
+  # the first id each partition owns, partition i owning [starts[i], starts[i + 1])
+  starts: List[int]
+
+  # the DataSystem every partition holds its records in
+  backend: type[DataSystem]
+
+  # whether the partitions are served by threads rather than processes
+  threads: bool
+
+  # threads=None picks threads on a free-threaded build and processes otherwise
+  def __init__(self, data: Sequence[Employee], space: IdSpace = DEFAULT_SPACE, partitions: int = 2,
+               backend: type[DataSystem] = SortedDataSystem, threads: bool | None = None) -> None:
+    self.space = space
+    self.backend = backend
+    self.threads = threads if threads != None else free_threaded()
+    self.start(sorted([(emp.id, emp.balance) for emp in data]), partitions)
+
+  # a PartitionedDataSystem over the records of data, each partition holding them in a DataSystem of the same kind
+  @classmethod
+  def over(cls, data: DataSystem, partitions: int, threads: bool | None = None) -> 'PartitionedDataSystem':
+    ds = cls.__new__(cls)
+    ds.space = data.space
+    ds.backend = type(data)
+    ds.threads = threads if threads != None else free_threaded()
+    ds.start(data.records(), partitions)
+    return ds
+
+  # split the (id, balance) records, in id order, into partitions holding as many records each, or the id space evenly if there are
+  #   too few records to go around
+  def start(self, records: List[Tuple[int, int]], partitions: int):
+    if len(records) >= partitions:
+      self.starts = [0] + [records[len(records) * i // partitions][0] for i in range(1, partitions)]
+    else:
+      self.starts = [self.space.size * i // partitions for i in range(partitions)]
+    bounds = [bisect_left(records, (start, -1)) for start in self.starts] + [len(records)]
+    partition = ThreadPartition if self.threads else ProcessPartition
+    self.partitions = [partition(self.backend, records[bounds[i]:bounds[i + 1]], self.space) for i in range(partitions)]
+
+  # the partition owning id
+  def owner(self, id: int) -> int:
+    return bisect_right(self.starts, id) - 1
+
+  # the partitions owning some id in [low, high]
+  def owners(self, low: int, high: int) -> range:
+    return range(self.owner(low), self.owner(high) + 1)
+
+  # apply op to the partitions numbered ns at once, returning what it returned on each in order
+  def gather(self, ns: Sequence[int], op: str, *args) -> List:
+    if len(ns) == 1:
+      return [self.partitions[ns[0]].run(op, *args)]
+    [self.partitions[n].submit(op, *args) for n in ns]
+    return [self.partitions[n].result() for n in ns]
+
+  def call(self, id: int, op: str, *args):
+    return self.gather([self.owner(id)], op, id, *args)[0]
+
+  def find(self, employee_id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int]:
+    ns = self.owners(*self.space.window(employee_id))
+    return nearest(self.gather(ns, 'find', employee_id)) if len(ns) > 1 else self.call(employee_id, 'find')
+
+  def query(self, employee_id: int) -> Tuple[DataStatus] | Tuple[DataStatus, int]:
+    return self.call(employee_id, 'query')
+
+  def give(self, case: DataStatus, employee_id: int, p: int):
+    self.gather([self.owner(employee_id)], 'give', case, employee_id, p)
+
+  def set(self, employee_id: int, p: int):
+    self.call(employee_id, 'set', p)
+
+  def clear(self, employee_id: int):
+    return self.call(employee_id, 'clear')
+
+  def scan(self, low: int, high: int) -> List[Tuple[int, int]]:
+    return [record for records in self.gather(self.owners(low, high), 'scan', low, high) for record in records]
+
+  def members(self) -> List[int]:
+    return [id for (id, _) in self.records()]
+
+  def records(self) -> List[Tuple[int, int]]:
+    return [record for records in self.gather(range(len(self.partitions)), 'records') for record in records]
+
+  # a command within a single partition is taken there directly, skipping the grouping of take_many
+  def take(self, control: ControlStatus, employee_id: int) -> Tuple:
+    ns = self.owners(*self.space.window(employee_id)) if control == ControlStatus.FIND else [self.owner(employee_id)]
+    if len(ns) == 1:
+      return self.partitions[ns[0]].run('take', control, employee_id)
+    return self.take_many([(control, employee_id)])[0]
+
+  # take the commands in order, running each stretch of them that stays within single partitions on all of them at once
+  def take_many(self, cmds: List[Tuple[ControlStatus, int]]) -> List[Tuple]:
+    results: List[Tuple] = [()] * len(cmds)
+    groups: dict[int, List[int]] = dict()
+    for (i, (control, id)) in enumerate(cmds):
+      ns = self.owners(*self.space.window(id)) if control == ControlStatus.FIND else [self.owner(id)]
+      if len(ns) == 1:
+        groups.setdefault(ns[0], []).append(i)
+        continue
+      self.dispatch(cmds, groups, results)
+      groups = dict()
+      if (result := nearest(self.gather(ns, 'find', id)))[0] != DataStatus.FAIL:
+        self.call(result[1], 'clear')
+      results[i] = result
+    self.dispatch(cmds, groups, results)
+    return results
+
+  # take the commands at the indices grouped under each partition on all the partitions at once, filing the results at those indices
+  def dispatch(self, cmds: List[Tuple[ControlStatus, int]], groups: dict[int, List[int]], results: List[Tuple]):
+    [self.partitions[n].submit('take_many', [cmds[i] for i in indices]) for (n, indices) in groups.items()]
+    for (n, indices) in groups.items():
+      for (i, result) in zip(indices, self.partitions[n].result()):
+        results[i] = result
+
+  def empty(self) -> 'PartitionedDataSystem':
+    self.terminate()
+    return PartitionedDataSystem([], self.space, len(self.partitions), self.backend, self.threads)
+
+  # stop the workers
+  def terminate(self):
+    [partition.close() for partition in self.partitions]
@@ -0,0 +1,201 @@
+# an in-process stand-in for the cs145lib.task2 judge: simulated channels, a synthetic command generator and an end-to-end harness
+#   driving task2.brandy and task2.tandy, run as `python sim.py --help`
+
+import argparse
+import contextlib
+import io
+import queue
+import random
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+from data_sys import DataSystem
+from log_sys import LOG
+from node_sys import shard_ranges
+from status import ControlStatus, DataStatus
+
+ID_SPACE = 65535 + 1
+
+class SimEmployee(NamedTuple):
+  id: int
+  balance: int
+
+
+# one end of a simulated point-to-point link, frames take latency seconds plus len / bandwidth seconds to arrive
+#   and frames sent back to back queue behind each other on the wire
+class SimChannel:
+
+  inbox: queue.Queue
+  outbox: queue.Queue
+  latency: float
+
+  # bytes per second, None for unlimited
+  bandwidth: float | None
+
+  # if set, every frame written is also delivered back to the writer, as on a shared medium
+  echo: bool
+
+  # when the outgoing wire is next free
+  free_at: float
+
+  def __init__(self, inbox: queue.Queue, outbox: queue.Queue, latency: float, bandwidth: float | None, echo: bool) -> None:
+    self.inbox = inbox
+    self.outbox = outbox
+    self.latency = latency
+    self.bandwidth = bandwidth
+    self.echo = echo
+    self.free_at = 0.0
+
+  def write_frame(self, frame: bytes) -> None:
+    frame = bytes(frame)
+    self.free_at = max(time.perf_counter(), self.free_at) + (len(frame) / self.bandwidth if self.bandwidth else 0.0)
+    self.outbox.put((self.free_at + self.latency, frame))
+    if self.echo:
+      self.inbox.put((self.free_at + self.latency, frame))
+
+  def read_frame(self) -> bytes:
+    (arrival, frame) = self.inbox.get()
+    if (wait := arrival - time.perf_counter()) > 0:
+      time.sleep(wait)
+    return frame
+
+
+def channel_pair(latency: float = 0.0, bandwidth: float | None = None, echo: bool = False) -> Tuple[SimChannel, SimChannel]:
+  a, b = queue.Queue(), queue.Queue()
+  return SimChannel(a, b, latency, bandwidth, echo), SimChannel(b, a, latency, bandwidth, echo)
+
+
+# build a population of employees occupying roughly density * ID_SPACE ids
+def make_people(density: float, seed: int = 145) -> List[SimEmployee]:
+  rng = random.Random(seed)
+  ids = rng.sample(range(ID_SPACE), max(1, int(ID_SPACE * density)))
+  return [SimEmployee(i, rng.randint(20000, 100000)) for i in ids]
+
+
+# yield n (control, id, pesos) commands, pesos being 0 for QUERY
+#   hit_rate is the chance an id is drawn from the population rather than uniformly from the id space
+#   locality is the chance an id is drawn within span of the previous one instead
+def generate(people: List[SimEmployee], n: int, give_rate: float = 0.5, hit_rate: float = 0.5, locality: float = 0.0,
+             span: int = 100, seed: int = 145) -> Iterator[Tuple[ControlStatus, int, int]]:
+  rng = random.Random(seed)
+  ids = [emp.id for emp in people]
+  id = rng.randrange(ID_SPACE)
+  for _ in range(n):
+    if rng.random() < locality:
+      id = min(max(id + rng.randint(-span, span), 0), ID_SPACE - 1)
+    elif rng.random() < hit_rate:
+      id = rng.choice(ids)
+    else:
+      id = rng.randrange(ID_SPACE)
+    if rng.random() < give_rate:
+      yield (ControlStatus.GIVE, id, rng.randint(1, 1000))
+    else:
+      yield (ControlStatus.QUERY, id, 0)
+
+
+# the frame the judge sends for a command
+def command_frame(cmd: Tuple[ControlStatus, int, int]) -> bytes:
+  if cmd[0] == ControlStatus.GIVE:
+    return bytes([ControlStatus.GIVE.value]) + cmd[1].to_bytes(2, 'big') + cmd[2].to_bytes(4, 'big')
+  return bytes([ControlStatus.QUERY.value]) + cmd[1].to_bytes(2, 'big')
+
+
+# the submission a correct node would answer a command with, applying it to the reference dataset
+def expected_frame(reference: DataSystem, cmd: Tuple[ControlStatus, int, int]) -> bytes:
+  if cmd[0] == ControlStatus.GIVE:
+    result = reference.find(cmd[1])
+    if result[0] == DataStatus.FAIL:
+      return bytes([DataStatus.FAIL.value])
+    reference.give(result[0], result[1], cmd[2])
+    return bytes([DataStatus.OK.value, result[0].value])
+  result = reference.query(cmd[1])
+  if result[0] == DataStatus.FAIL:
+    return bytes([DataStatus.FAIL.value])
+  return bytes([DataStatus.OK.value]) + result[1].to_bytes(8, 'big')
+
+
+class Report(NamedTuple):
+  operations: int
+  seconds: float
+  latencies: List[float]
+  mismatches: int
+
+  def percentile(self, q: float) -> float:
+    ordered = sorted(self.latencies)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+  def __str__(self) -> str:
+    return (f"{self.operations} ops in {self.seconds:.3f} s: {self.operations / self.seconds:.0f} ops/s, "
+            f"p50 {self.percentile(0.5) * 1e3:.3f} ms, p99 {self.percentile(0.99) * 1e3:.3f} ms, {self.mismatches} mismatches")
+
+
+# run brandy and tandy on their shares of people against the commands, returning the judge's view of the run
+#   with several slaves brandy is called with one channel per slave and the i-th tandy gets the slave people in shard_ranges(slaves)[i]
+#   with stream set the judge ends the commands with an empty frame, for a brandy that streams commands until told to stop
+#   the nodes' log and anything else they print is discarded
+def run(brandy: Callable, tandy: Callable, people: List[SimEmployee], commands: Iterable[Tuple[ControlStatus, int, int]],
+        master_share: float = 0.5, latency: float = 0.0, bandwidth: float | None = None, echo: bool = False, seed: int = 145,
+        slaves: int = 1, stream: bool = False) -> Report:
+  rng = random.Random(seed)
+  shuffled = rng.sample(people, len(people))
+  split = int(len(shuffled) * master_share)
+  reference = DataSystem(people)
+
+  judge_ch, generoso_ch = channel_pair(latency, bandwidth, echo)
+  slave_chs = [channel_pair(latency, bandwidth, echo) for _ in range(slaves)]
+  nodes = [threading.Thread(target=brandy, args=(shuffled[:split], generoso_ch, *[pair[0] for pair in slave_chs]), daemon=True)]
+  for (ids, pair) in zip(shard_ranges(slaves), slave_chs):
+    nodes.append(threading.Thread(target=tandy, args=([emp for emp in shuffled[split:] if emp.id in ids], pair[1]), daemon=True))
+
+  latencies = []
+  mismatches = 0
+  with LOG.redirect(io.StringIO()), contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+    [node.start() for node in nodes]
+    begin = time.perf_counter()
+    for cmd in commands:
+      frame = command_frame(cmd)
+      start = time.perf_counter()
+      judge_ch.write_frame(frame)
+      reply = judge_ch.read_frame()
+      while echo and reply == frame:
+        reply = judge_ch.read_frame()
+      latencies.append(time.perf_counter() - start)
+      mismatches += reply != expected_frame(reference, cmd)
+    if stream:
+      judge_ch.write_frame(b'')
+    seconds = time.perf_counter() - begin
+    [node.join(timeout=5) for node in nodes]
+  return Report(len(latencies), seconds, latencies, mismatches)
+
+
+if __name__ == '__main__':
+  import functools
+  import task2
+
+  parser = argparse.ArgumentParser(description="drive task2.brandy/tandy end to end over simulated channels")
+  parser.add_argument('--ops', type=int, default=1000, help="MasterNode.operate stops at 1000 unless --stream is given")
+  parser.add_argument('--density', type=float, default=0.01, help="fraction of the id space holding an employee")
+  parser.add_argument('--give-rate', type=float, default=0.5)
+  parser.add_argument('--hit-rate', type=float, default=0.5)
+  parser.add_argument('--locality', type=float, default=0.0)
+  parser.add_argument('--latency', type=float, default=0.0, help="seconds per frame")
+  parser.add_argument('--bandwidth', type=float, default=None, help="bytes per second")
+  parser.add_argument('--echo', action='store_true')
+  parser.add_argument('--slaves', type=int, default=1)
+  parser.add_argument('--seed', type=int, default=145)
+  parser.add_argument('--stream', action='store_true', help="stream all --ops commands, ended by an empty frame")
+  parser.add_argument('--trace', default=None, help="record the master's frames here, replay with `python trace_sys.py`")
+  parser.add_argument('--partitions', type=int, default=1, help="workers per slave, see part_sys")
+  parser.add_argument('--workers', choices=['auto', 'threads', 'processes'], default='auto',
+                      help="the kind of partition worker, auto picking threads only on a free-threaded build")
+  parser.add_argument('--window', type=int, default=1, help="lookups in flight per slave link, see SlaveDriver.pipeline")
+  args = parser.parse_args()
+
+  people = make_people(args.density, args.seed)
+  commands = generate(people, args.ops, args.give_rate, args.hit_rate, args.locality, seed=args.seed)
+  brandy = functools.partial(task2.brandy_sharded, operations=None if args.stream else 1000, trace_path=args.trace,
+                             window=args.window)
+  tandy = functools.partial(task2.tandy, partitions=args.partitions,
+                            threads={'auto': None, 'threads': True, 'processes': False}[args.workers])
+  print(run(brandy, tandy, people, commands, latency=args.latency, bandwidth=args.bandwidth, echo=args.echo,
+            seed=args.seed, slaves=args.slaves, stream=args.stream))
@@ -0,0 +1,109 @@
+# this module persists the records a node starts from, and on the master its SybilSystem, to a snapshot file and maps it back in on restart
+#   layout: HEADER | balances as uint64 | presence | white | black, each column indexed by id as in ColumnarDataSystem, in native byte order
+#   the file is mapped copy-on-write and the balance column used in place, so writes never reach it and only the pages a command touches
+#   are read in, besides the checksum pass
+
+# restoring a snapshot gives a node the very state it would rebuild from its people: the records are written as the node starts, before
+#   any command moves or changes them, and termination only adds the master's Sybil arrays, which hold the membership of the whole
+#   deployment and so stay true of the same people whatever moved where; each node's snapshot is thus consistent with every other's
+
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Sequence
+from typing import NamedTuple
+from cs145lib.task2 import Employee
+from data_sys import ColumnarDataSystem, DataSystem
+from log_sys import LOG
+from space_sys import DEFAULT_SPACE, IdSpace
+
+MAGIC = b'SNAP'
+VERSION = 3
+
+# magic, version, byte order, whether the Sybil columns follow, fingerprint of the people, crc32 of everything past the header,
+#   the id width and GIVE radius of the space the snapshot was taken in, padded to 24 bytes so that the balance column starts 8-byte aligned
+HEADER = struct.Struct('<4sHcBIIBH5x')
+
+# identify the people a node started from, a snapshot is only reopened for the very same people
+def fingerprint(people: Sequence[Employee]) -> int:
+  records = sorted([(emp.id, emp.balance) for emp in people])
+  crc = zlib.crc32(array('H', [id for (id, _) in records]).tobytes())
+  return zlib.crc32(array('Q', [p for (_, p) in records]).tobytes(), crc)
+
+
+class Snapshot(NamedTuple):
+  data: ColumnarDataSystem
+
+  # the SybilSystem arrays, None in a slave's snapshot
+  white: bytearray | None
+  black: bytearray | None
+
+
+# this class reads and writes the snapshot of one node, whose people are fingerprinted to tell a stale snapshot from a current one
+class Snapshotter:
+
+  path: str
+  fingerprint: int
+  space: IdSpace
+
+  # snapshots lay out whole columns by id, so they only exist for spaces dense enough to preallocate
+  def __init__(self, path: str, people: Sequence[Employee], space: IdSpace = DEFAULT_SPACE) -> None:
+    assert space.dense, "snapshots need a dense id space"
+    self.path = path
+    self.fingerprint = fingerprint(people)
+    self.space = space
+
+  # map the snapshot back in, or None if there is none or it does not belong to these people, this space, this build or this machine
+  def restore(self) -> Snapshot | None:
+    try:
+      with open(self.path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (FileNotFoundError, ValueError):
+      return None
+    if len(mm) < HEADER.size:
+      return None
+    (magic, version, order, sybil, fp, crc, id_bytes, radius) = HEADER.unpack_from(mm)
+    view = memoryview(mm)
+    size = self.space.size
+    if (magic != MAGIC or version != VERSION or order != sys.byteorder[0].encode() or fp != self.fingerprint
+        or (id_bytes, radius) != (self.space.id_bytes, self.space.radius)
+        or len(mm) != HEADER.size + size * (8 + 1 + (2 if sybil else 0)) or zlib.crc32(view[HEADER.size:]) != crc):
+      LOG.warn("rejecting stale snapshot %s", self.path)
+      return None
+
+    present_at = HEADER.size + 8 * size
+    white_at = present_at + size
+    data = ColumnarDataSystem.over(bytearray(view[present_at:white_at]), view[HEADER.size:present_at].cast('Q'), self.space)
+    if not sybil:
+      return Snapshot(data, None, None)
+    return Snapshot(data, bytearray(view[white_at:white_at + size]), bytearray(view[white_at + size:white_at + 2 * size]))
+
+  # write the records, and the Sybil arrays if given, replacing the previous snapshot in one rename
+  #   data must be the node's starting records, see the note above
+  def save(self, data: DataSystem, white: bytearray | None = None, black: bytearray | None = None):
+    if not isinstance(data, ColumnarDataSystem):
+      columns = ColumnarDataSystem([], self.space)
+      [columns.set(id, p) for (id, p) in data.records()]
+      data = columns
+    body = bytes(data.balances) + bytes(data.present)
+    if white != None and black != None:
+      body += bytes(white) + bytes(black)
+    self.write(body, white != None and black != None)
+
+  # add the Sybil arrays to the snapshot saved or restored as the node started, whose records stay as they were
+  def save_sybil(self, white: bytearray, black: bytearray):
+    with open(self.path, 'rb') as f:
+      f.seek(HEADER.size)
+      columns = f.read(9 * self.space.size)
+    self.write(columns + bytes(white) + bytes(black), True)
+
+  def write(self, body: bytes, sybil: bool):
+    header = HEADER.pack(MAGIC, VERSION, sys.byteorder[0].encode(), sybil, self.fingerprint, zlib.crc32(body), self.space.id_bytes,
+                         self.space.radius)
+    with open(self.path + '.tmp', 'wb') as f:
+      f.write(header)
+      f.write(body)
+    os.replace(self.path + '.tmp', self.path)
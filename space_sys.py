@@ -0,0 +1,111 @@
+# this module describes the space the nodes run in: how wide ids and the judge's peso fields are on the wire and how far a GIVE searches
+#   the default is the judge's own, 16-bit ids, 4-byte GIVE pesos and a radius of 100, where a byte per id is cheap enough to preallocate;
+#   every wider space keeps its per-id structures sparse with PagedBytes instead
+
+from typing import NamedTuple, Tuple
+
+# the width in bytes of each struct code an id or peso field may take
+STRUCT_CODES = {2: 'H', 4: 'I', 8: 'Q'}
+
+class IdSpace(NamedTuple):
+  id_bytes: int = 2
+  peso_bytes: int = 4
+  radius: int = 100
+
+  # how many ids there are and the last of them
+  @property
+  def size(self) -> int:
+    return 1 << (8 * self.id_bytes)
+
+  @property
+  def last(self) -> int:
+    return self.size - 1
+
+  # whether per-id structures are preallocated over the whole space rather than paged
+  @property
+  def dense(self) -> bool:
+    return self.id_bytes <= 2
+
+  # the ids [low, high] a GIVE on id resolves against
+  def window(self, id: int) -> Tuple[int, int]:
+    return (max(id - self.radius, 0), min(id + self.radius, self.last))
+
+  # a zeroed byte per id
+  def bytemap(self) -> 'bytearray | PagedBytes':
+    return bytearray(self.size) if self.dense else PagedBytes()
+
+
+DEFAULT_SPACE = IdSpace()
+
+PAGE_BITS = 12
+PAGE = 1 << PAGE_BITS
+
+# a byte per id over an id space of any size, only the PAGE-byte pages that were written to are allocated and the rest read as default
+#   supports the parts of the bytearray interface SybilSystem and ColumnarDataSystem use: indexing, slice assignment of a run of bytes,
+#   find and rfind of a single byte value, count and translate
+class PagedBytes:
+
+  pages: dict[int, bytearray]
+  default: int
+
+  def __init__(self, default: int = 0) -> None:
+    self.pages = dict()
+    self.default = default
+
+  def page(self, n: int) -> bytearray:
+    if (page := self.pages.get(n, None)) == None:
+      page = self.pages[n] = bytearray([self.default]) * PAGE
+    return page
+
+  def __getitem__(self, i: int) -> int:
+    page = self.pages.get(i >> PAGE_BITS, None)
+    return page[i & (PAGE - 1)] if page != None else self.default
+
+  # assign a byte, or a run of bytes to the slice [start, stop)
+  def __setitem__(self, key: int | slice, value: int | bytes):
+    if isinstance(key, int):
+      if value != self.default or (key >> PAGE_BITS) in self.pages:
+        self.page(key >> PAGE_BITS)[key & (PAGE - 1)] = value
+      return
+    assert isinstance(value, (bytes, bytearray))
+    (start, stop) = (key.start, key.stop)
+    while start < stop:
+      end = min((start | (PAGE - 1)) + 1, stop)
+      self.page(start >> PAGE_BITS)[start & (PAGE - 1):(end - 1 & (PAGE - 1)) + 1] = value[start - key.start:end - key.start]
+      start = end
+
+  # the first i in [start, stop) holding value, or -1
+  def find(self, value: int, start: int = 0, stop: int | None = None) -> int:
+    stop = stop if stop != None else max(self.pages, default=-1) + 1 << PAGE_BITS
+    while start < stop:
+      end = min((start | (PAGE - 1)) + 1, stop)
+      page = self.pages.get(start >> PAGE_BITS, None)
+      if page == None:
+        if value == self.default:
+          return start
+      elif (i := page.find(value, start & (PAGE - 1), (end - 1 & (PAGE - 1)) + 1)) != -1:
+        return (start & ~(PAGE - 1)) + i
+      start = end
+    return -1
+
+  # the last i in [start, stop) holding value, or -1
+  def rfind(self, value: int, start: int, stop: int) -> int:
+    while start < stop:
+      begin = max(stop - 1 & ~(PAGE - 1), start)
+      page = self.pages.get(begin >> PAGE_BITS, None)
+      if page == None:
+        if value == self.default:
+          return stop - 1
+      elif (i := page.rfind(value, begin & (PAGE - 1), (stop - 1 & (PAGE - 1)) + 1)) != -1:
+        return (begin & ~(PAGE - 1)) + i
+      stop = begin
+    return -1
+
+  # how many of the allocated bytes hold value, which is every such byte unless value is the default
+  def count(self, value: int) -> int:
+    return sum([page.count(value) for page in self.pages.values()])
+
+  def translate(self, table: bytes) -> 'PagedBytes':
+    ret = PagedBytes(table[self.default])
+    ret.pages = dict([(n, page.translate(table)) for (n, page) in self.pages.items()])
+    return ret
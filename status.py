@@ -12,6 +12,12 @@ class ControlStatus(Enum):
   GIVE = 102
   TERM = 255
   FIND = 201
+  BATCH = 202
+  BULK = 203
+  HELO = 204
+  MEMB = 205
+  STORE = 206
+  FIND_RANGE = 207
   
 class CommStatus(Enum):
   CMD = 1
@@ -1,21 +1,66 @@
+import asyncio
 from collections.abc import Sequence
 
 from cs145lib.task2 import Employee, Channel, node_main
+from async_sys import AsyncMasterNode, AsyncSlaveDriver, AsyncSlaveNode
 from comms_sys import CommSystem
-from data_sys import DataSystem
-from node_sys import MasterNode, SlaveDriver, SlaveNode
+from data_sys import SortedDataSystem
+from node_sys import MasterNode, SlaveDriver, SlaveNode, shard_ranges
+from snap_sys import Snapshotter
+from space_sys import DEFAULT_SPACE, IdSpace
+from trace_sys import TraceRecorder
 
 
-def brandy(people: Sequence[Employee], generoso_ch: Channel, tandy_ch: Channel) -> None:
-    sources = [DataSystem(people), SlaveDriver(tandy_ch)]
-    me = MasterNode(generoso_ch, sources)
+# replicate pulls all of tandy's records over before the first command instead of migrating them lazily on each hit
+def brandy(people: Sequence[Employee], generoso_ch: Channel, tandy_ch: Channel, replicate: bool = False) -> None:
+    brandy_sharded(people, generoso_ch, tandy_ch, replicate=replicate)
+
+
+# run the master against any number of slaves, the i-th of which must hold only ids in shard_ranges(len(slave_chs))[i]
+#   operations=None streams commands until generoso ends the stream instead of stopping after a fixed count
+#   snapshot_path keeps the master's records and Sybil knowledge across runs on the same people, see snap_sys
+#   trace_path records every frame the master sends or receives, for replay with `python trace_sys.py`
+#   space sets the width of ids and judge peso fields and the GIVE radius, and must match the slaves' and the judge's, see space_sys
+#   window bounds the lookups SlaveDriver.pipeline keeps in flight per slave; the master itself never has more than one pending per
+#   slave, see SlaveDriver.batch, so a window above 1 only matters to callers pipelining on the drivers
+def brandy_sharded(people: Sequence[Employee], generoso_ch: Channel, *slave_chs: Channel, replicate: bool = False,
+                   operations: int | None = 1000, snapshot_path: str | None = None, trace_path: str | None = None,
+                   space: IdSpace = DEFAULT_SPACE, window: int = 1) -> None:
+    drivers = [SlaveDriver(ch, ids, space) for (ch, ids) in zip(slave_chs, shard_ranges(len(slave_chs), space))]
+    me = MasterNode(generoso_ch, [SortedDataSystem(people, space)] + drivers, operations=operations,
+                    snapshotter=Snapshotter(snapshot_path, people, space) if snapshot_path != None else None,
+                    recorder=TraceRecorder(trace_path) if trace_path != None else None, space=space)
+    [driver.negotiate(compact=True, sequenced=True, window=window) for driver in drivers]
+    if replicate:
+        me.replicate()
+    me.warm_start()
     me.operate()
 
 
-def tandy(people: Sequence[Employee], brandy_ch: Channel) -> None:
-    me = SlaveNode(people, brandy_ch)
+# partitions above 1 spreads tandy's records over that many workers, threads choosing their kind as for SlaveNode, see part_sys
+def tandy(people: Sequence[Employee], brandy_ch: Channel, snapshot_path: str | None = None, trace_path: str | None = None,
+          space: IdSpace = DEFAULT_SPACE, partitions: int = 1, threads: bool | None = None) -> None:
+    me = SlaveNode(people, brandy_ch, SortedDataSystem, Snapshotter(snapshot_path, people, space) if snapshot_path != None else None,
+                   TraceRecorder(trace_path) if trace_path != None else None, space, partitions, threads)
     me.operate()
 
 
+
+# brandy_sharded on the asyncio nodes of async_sys
+def brandy_async(people: Sequence[Employee], generoso_ch: Channel, *slave_chs: Channel, operations: int | None = 1000,
+                 space: IdSpace = DEFAULT_SPACE) -> None:
+    async def main():
+        drivers = [AsyncSlaveDriver(ch, ids, space) for (ch, ids) in zip(slave_chs, shard_ranges(len(slave_chs), space))]
+        me = AsyncMasterNode(generoso_ch, [SortedDataSystem(people, space)] + drivers, operations=operations, space=space)
+        await asyncio.gather(*[driver.negotiate(compact=True, sequenced=True) for driver in drivers])
+        await me.warm_start()
+        await me.operate()
+    asyncio.run(main())
+
+
+def tandy_async(people: Sequence[Employee], brandy_ch: Channel, space: IdSpace = DEFAULT_SPACE) -> None:
+    asyncio.run(AsyncSlaveNode(people, brandy_ch, SortedDataSystem, space=space).operate())
+
+
 if __name__ == '__main__':
     node_main(brandy, tandy)
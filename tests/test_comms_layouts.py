@@ -0,0 +1,150 @@
+# the precompiled layouts of comms_sys against the byte layouts the original CommSystem built field by field with send_translate and
+#   int.to_bytes, which the judge and older nodes still speak
+
+import pytest
+from comms_sys import BATCH_MAX, CommSystem
+from space_sys import IdSpace
+from status import CommStatus, ControlStatus, DataStatus
+
+IDS = [0, 1, 255, 256, 4660, 65534, 65535]
+PESOS = [0, 1, 20000, 65535, 65536, 100000, (1 << 24) - 1]
+JUDGE_PESOS = PESOS + [1 << 24, (1 << 32) - 1]
+CASES = [DataStatus.CASE1, DataStatus.CASE2, DataStatus.CASE3]
+
+def comms(send: CommStatus, rcv: CommStatus, space: IdSpace | None = None) -> CommSystem:
+  return CommSystem(None, send, rcv) if space == None else CommSystem(None, send, rcv, space)
+
+# the original layouts, one field at a time
+def baseline_cmd(control: ControlStatus, id: int) -> bytes:
+  return control.value.to_bytes(1, 'big') + id.to_bytes(2, 'big')
+
+def baseline_data(item: tuple) -> bytes:
+  sender = comms(CommStatus.DAT, CommStatus.CMD)
+  match len(item):
+    case 1:
+      return sender.send_translate(item[0])
+    case 2:
+      return sender.send_translate(item[0]) + sender.send_translate(item[1])
+    case 3:
+      return sender.send_translate(item[0]) + sender.send_translate(item[1], True) + sender.send_translate(item[2])
+
+def baseline_give(item: bytes) -> tuple:
+  return (ControlStatus.GIVE, int.from_bytes(item[1:3], 'big'), int.from_bytes(item[3:], 'big'))
+
+
+@pytest.mark.parametrize('control', [ControlStatus.QUERY, ControlStatus.FIND, ControlStatus.FIND_RANGE, ControlStatus.MEMB])
+@pytest.mark.parametrize('id', IDS)
+def test_cmd_frames(control, id):
+  frame = comms(CommStatus.CMD, CommStatus.DAT).send_cmd_translate((control, id))
+  assert frame == baseline_cmd(control, id)
+  assert frame == comms(CommStatus.CMD, CommStatus.DAT).send_translate((control, id))
+  assert comms(CommStatus.DAT, CommStatus.CMD).receive_cmd_translate(frame) == (control, id)
+
+@pytest.mark.parametrize('id', [0, 1, 255])
+def test_short_query_frames(id):
+  frame = ControlStatus.QUERY.value.to_bytes(1, 'big') + id.to_bytes(1, 'big')
+  assert comms(CommStatus.DAT, CommStatus.CMD).receive_cmd_translate(frame) == (ControlStatus.QUERY, id)
+
+# a 6-byte give carries 3 bytes of pesos and a 7-byte one 4
+@pytest.mark.parametrize(('width', 'p'), [(width, p) for width in (6, 7) for p in JUDGE_PESOS if p < 1 << (8 * (width - 3))])
+@pytest.mark.parametrize('id', IDS)
+def test_give_frames(width, p, id):
+  frame = ControlStatus.GIVE.value.to_bytes(1, 'big') + id.to_bytes(2, 'big') + p.to_bytes(width - 3, 'big')
+  assert comms(CommStatus.DAT, CommStatus.CMD).receive_cmd_translate(frame) == baseline_give(frame)
+
+@pytest.mark.parametrize('id', IDS)
+@pytest.mark.parametrize('p', [0, 20000, (1 << 32) - 1, 1 << 32, (1 << 64) - 1])
+def test_store_frames(id, p):
+  frame = comms(CommStatus.CMD, CommStatus.DAT).send_cmd_translate((ControlStatus.STORE, id, p))
+  assert frame == ControlStatus.STORE.value.to_bytes(1, 'big') + id.to_bytes(2, 'big') + p.to_bytes(8, 'big')
+  assert comms(CommStatus.DAT, CommStatus.CMD).receive_cmd_translate(frame) == (ControlStatus.STORE, id, p)
+
+@pytest.mark.parametrize('count', [1, 2, 3, 7, BATCH_MAX])
+def test_batch_frames(count):
+  cmds = [([ControlStatus.FIND, ControlStatus.QUERY][i % 2], IDS[i % len(IDS)]) for i in range(count)]
+  frame = comms(CommStatus.CMD, CommStatus.DAT).send_batch_translate(cmds)
+  assert frame == bytes([ControlStatus.BATCH.value, count]) + b''.join([baseline_cmd(control, id) for (control, id) in cmds])
+  assert comms(CommStatus.DAT, CommStatus.CMD).receive_cmd_translate(frame) == (ControlStatus.BATCH, cmds)
+
+def test_batch_frames_never_look_like_single_commands():
+  sizes = [len(comms(CommStatus.CMD, CommStatus.DAT).send_batch_translate([(ControlStatus.FIND, 0)] * n)) for n in range(1, BATCH_MAX + 1)]
+  assert not set(sizes) & {2, 3, 6, 7}
+
+@pytest.mark.parametrize('case', CASES)
+@pytest.mark.parametrize('id', IDS)
+@pytest.mark.parametrize('p', PESOS)
+def test_find_data_frames(case, id, p):
+  frame = comms(CommStatus.DAT, CommStatus.CMD).send_data_translate((case, id, p))
+  assert frame == baseline_data((case, id, p))
+  receiver = comms(CommStatus.CMD, CommStatus.DAT)
+  receiver.requests = [(ControlStatus.FIND, id)]
+  assert receiver.receive_data_translate(frame) == (case, id, p)
+
+@pytest.mark.parametrize('p', PESOS)
+def test_query_data_frames(p):
+  frame = comms(CommStatus.DAT, CommStatus.CMD).send_data_translate((DataStatus.OK, p))
+  assert frame == baseline_data((DataStatus.OK, p))
+  receiver = comms(CommStatus.CMD, CommStatus.DAT)
+  receiver.requests = [(ControlStatus.QUERY, 0)]
+  assert receiver.receive_data_translate(frame) == (DataStatus.OK, p)
+
+@pytest.mark.parametrize('control', [ControlStatus.FIND, ControlStatus.QUERY])
+def test_fail_data_frames(control):
+  frame = comms(CommStatus.DAT, CommStatus.CMD).send_data_translate((DataStatus.FAIL, ))
+  assert frame == baseline_data((DataStatus.FAIL, )) == bytes([DataStatus.FAIL.value])
+  receiver = comms(CommStatus.CMD, CommStatus.DAT)
+  receiver.requests = [(control, 0)]
+  assert receiver.receive_data_translate(frame) == (DataStatus.FAIL, )
+
+# a batch reply is the data frames of its commands back to back
+def test_batch_replies():
+  cmds = [(ControlStatus.FIND, 10), (ControlStatus.QUERY, 20), (ControlStatus.FIND, 30), (ControlStatus.QUERY, 40)]
+  results = [(DataStatus.CASE2, 12, 100000), (DataStatus.OK, 65536), (DataStatus.FAIL, ), (DataStatus.FAIL, )]
+  sender = comms(CommStatus.DAT, CommStatus.CMD)
+  sender.requests = cmds
+  frame = sender.encode(results)
+  assert frame == b''.join([baseline_data(result) for result in results])
+  assert comms(CommStatus.CMD, CommStatus.DAT).receive_batch_translate(frame, cmds) == results
+
+@pytest.mark.parametrize('control', [ControlStatus.GIVE, ControlStatus.QUERY])
+def test_fail_submissions(control):
+  submitter = comms(CommStatus.SUB, CommStatus.CMD)
+  submitter.set_control(control)
+  assert submitter.submit_translate((DataStatus.FAIL, )) == bytes([DataStatus.FAIL.value])
+
+@pytest.mark.parametrize('case', CASES)
+def test_give_submissions(case):
+  submitter = comms(CommStatus.SUB, CommStatus.CMD)
+  submitter.set_control(ControlStatus.GIVE)
+  assert submitter.submit_translate((case, 1, 20000)) == bytes([DataStatus.OK.value, case.value])
+
+@pytest.mark.parametrize('p', JUDGE_PESOS + [(1 << 64) - 1])
+def test_query_submissions(p):
+  submitter = comms(CommStatus.SUB, CommStatus.CMD)
+  submitter.set_control(ControlStatus.QUERY)
+  assert submitter.submit_translate((DataStatus.OK, p)) == bytes([DataStatus.OK.value]) + p.to_bytes(8, 'big')
+
+# a wider space widens the id and judge peso fields but keeps their order
+def test_wide_space_frames():
+  space = IdSpace(4, 4, 100)
+  (id, p) = ((1 << 32) - 2, (1 << 32) - 1)
+  cmd = comms(CommStatus.CMD, CommStatus.DAT, space).send_cmd_translate((ControlStatus.FIND, id))
+  assert cmd == ControlStatus.FIND.value.to_bytes(1, 'big') + id.to_bytes(4, 'big')
+  receiver = comms(CommStatus.DAT, CommStatus.CMD, space)
+  assert receiver.receive_cmd_translate(cmd) == (ControlStatus.FIND, id)
+  give = ControlStatus.GIVE.value.to_bytes(1, 'big') + id.to_bytes(4, 'big') + p.to_bytes(4, 'big')
+  assert receiver.receive_cmd_translate(give) == (ControlStatus.GIVE, id, p)
+  store = comms(CommStatus.CMD, CommStatus.DAT, space).send_cmd_translate((ControlStatus.STORE, id, 1 << 40))
+  assert store == ControlStatus.STORE.value.to_bytes(1, 'big') + id.to_bytes(4, 'big') + (1 << 40).to_bytes(8, 'big')
+  assert receiver.receive_cmd_translate(store) == (ControlStatus.STORE, id, 1 << 40)
+
+# where the peso width makes a give as long as a batch, the batch is still parsed as one
+@pytest.mark.parametrize(('space', 'count'), [(IdSpace(2, 2), 1), (IdSpace(4, 2), 1), (IdSpace(8, 2), 1), (IdSpace(2, 8), 3)])
+def test_batches_as_long_as_gives(space, count):
+  cmds = [(ControlStatus.FIND, 5)] * count
+  frame = comms(CommStatus.CMD, CommStatus.DAT, space).send_batch_translate(cmds)
+  receiver = comms(CommStatus.DAT, CommStatus.CMD, space)
+  assert len(frame) == receiver.layouts.give_frame.size
+  assert receiver.receive_cmd_translate(frame) == (ControlStatus.BATCH, cmds)
+  give = ControlStatus.GIVE.value.to_bytes(1, 'big') + (5).to_bytes(space.id_bytes, 'big') + (7).to_bytes(space.peso_bytes, 'big')
+  assert receiver.receive_cmd_translate(give) == (ControlStatus.GIVE, 5, 7)
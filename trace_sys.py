@@ -0,0 +1,226 @@
+# this module records every frame that crosses a node's channels to a compact binary trace and replays a trace through the node offline
+#   a trace is MAGIC followed by records, each a RECORD header and its payload
+#     READ and WRITE records hold a frame exactly as it crossed the channel, echoes and SEQ headers included
+#     LINK records name the link a later record's link number refers to, PEOPLE records hold the node's starting (id, balance) columns
+#   replaying feeds the recorded reads back in order, at full speed or at their original pacing, and counts writes that differ from the
+#   recording, so a run of the same code and configuration on the trace is an exact rerun of the incident
+#   run as `python trace_sys.py TRACE [--paced] [--stream]`
+
+import argparse
+import struct
+import threading
+import time
+from array import array
+from typing import Callable, List, NamedTuple, Tuple
+from cs145lib.task2 import Channel
+
+MAGIC = b'TRC2'
+
+# seconds since the recording started, operation number, kind, link number, payload length
+RECORD = struct.Struct('<dIBBI')
+
+READ = 0
+WRITE = 1
+LINK = 2
+PEOPLE = 3
+
+class TraceRecorder:
+
+  file: object
+  start: float
+
+  # the operation in progress, stamped on every frame recorded
+  op: int
+
+  links: dict[str, int]
+
+  # the nodes' lookups may run on several threads at once
+  lock: threading.Lock
+
+  # the buffer is written out every flush_ops operations or flush_seconds, whichever comes first, so that a node that crashes or hangs
+  #   still leaves all but its last few operations on disk
+  flush_ops: int
+  flush_seconds: float
+  flushed_op: int
+  flushed_at: float
+
+  def __init__(self, path: str, flush_ops: int = 64, flush_seconds: float = 1.0) -> None:
+    self.file = open(path, 'wb', buffering=1 << 20)
+    self.file.write(MAGIC)
+    self.start = time.perf_counter()
+    self.op = 0
+    self.links = dict()
+    self.lock = threading.Lock()
+    self.flush_ops = flush_ops
+    self.flush_seconds = flush_seconds
+    self.flushed_op = 0
+    self.flushed_at = self.start
+
+  def record(self, kind: int, link: int, payload: bytes):
+    with self.lock:
+      self.file.write(RECORD.pack(time.perf_counter() - self.start, self.op, kind, link, len(payload)))
+      self.file.write(payload)
+
+  def mark(self, op: int):
+    self.op = op
+    if op - self.flushed_op >= self.flush_ops or time.perf_counter() - self.flushed_at >= self.flush_seconds:
+      self.flush()
+
+  def flush(self):
+    with self.lock:
+      if not self.file.closed:
+        self.file.flush()
+    self.flushed_op = self.op
+    self.flushed_at = time.perf_counter()
+
+  # the (id, balance) records the node starts from
+  def people(self, records: List[Tuple[int, int]]):
+    self.record(PEOPLE, 0, array('Q', [id for (id, _) in records]).tobytes() + array('Q', [p for (_, p) in records]).tobytes())
+
+  # a channel recording every frame that crosses chan under the link name
+  def wrap(self, chan: Channel, name: str) -> 'TracingChannel':
+    self.links[name] = len(self.links)
+    self.record(LINK, self.links[name], name.encode())
+    return TracingChannel(chan, self, self.links[name])
+
+  # closing more than once is harmless, a node closes its recorder however it stops
+  def close(self):
+    with self.lock:
+      self.file.close()
+
+
+class TracingChannel:
+
+  chan: Channel
+  recorder: TraceRecorder
+  link: int
+
+  def __init__(self, chan: Channel, recorder: TraceRecorder, link: int) -> None:
+    self.chan = chan
+    self.recorder = recorder
+    self.link = link
+
+  def read_frame(self) -> bytes:
+    frame = self.chan.read_frame()
+    self.recorder.record(READ, self.link, bytes(frame))
+    return frame
+
+  def write_frame(self, frame: bytes) -> None:
+    self.recorder.record(WRITE, self.link, bytes(frame))
+    return self.chan.write_frame(frame)
+
+
+class Record(NamedTuple):
+  id: int
+  balance: int
+
+
+# a channel playing one link of a trace back, reads return the recorded reads in order and an empty frame once they run out
+class ReplayChannel:
+
+  reads: List[Tuple[float, bytes]]
+  writes: List[bytes]
+
+  # when the replay started, None at full speed; paced reads wait until as long after it as they arrived after the recording started
+  start: float | None
+
+  # how many writes have been made and how many of those differ from the recording
+  written: int
+  diverged: int
+
+  def __init__(self, reads: List[Tuple[float, bytes]], writes: List[bytes], start: float | None) -> None:
+    self.reads = reads[::-1]
+    self.writes = writes
+    self.start = start
+    self.written = 0
+    self.diverged = 0
+
+  def read_frame(self) -> bytes:
+    if not self.reads:
+      return b''
+    (t, frame) = self.reads.pop()
+    if self.start != None and (wait := self.start + t - time.perf_counter()) > 0:
+      time.sleep(wait)
+    return frame
+
+  def write_frame(self, frame: bytes) -> None:
+    self.diverged += self.written >= len(self.writes) or self.writes[self.written] != bytes(frame)
+    self.written += 1
+
+
+class Trace:
+
+  people: List[Record]
+
+  # per link name, its (seconds, operation, kind, frame) records in order
+  links: dict[str, List[Tuple[float, int, int, bytes]]]
+
+  def __init__(self, path: str) -> None:
+    self.people = []
+    self.links = dict()
+    names: dict[int, str] = dict()
+    with open(path, 'rb') as f:
+      data = f.read()
+    assert data[:len(MAGIC)] == MAGIC, f"{path} is not a trace"
+    pos = len(MAGIC)
+    while pos < len(data):
+      (t, op, kind, link, n) = RECORD.unpack_from(data, pos)
+      payload = data[pos + RECORD.size:pos + RECORD.size + n]
+      pos += RECORD.size + n
+      if kind == LINK:
+        names[link] = payload.decode()
+        self.links[names[link]] = []
+      elif kind == PEOPLE:
+        ids = array('Q', payload[:n // 2])
+        balances = array('Q', payload[n // 2:])
+        self.people = [Record(id, p) for (id, p) in zip(ids, balances)]
+      else:
+        self.links[names[link]].append((t, op, kind, payload))
+
+  # fresh channels replaying every link, sharing one clock if paced
+  def channels(self, paced: bool = False) -> dict[str, ReplayChannel]:
+    start = time.perf_counter() if paced else None
+    return dict([(name, ReplayChannel([(t, frame) for (t, _, kind, frame) in records if kind == READ],
+                                      [frame for (_, _, kind, frame) in records if kind == WRITE], start))
+                 for (name, records) in self.links.items()])
+
+
+class ReplayReport(NamedTuple):
+  seconds: float
+  frames: int
+  diverged: int
+
+  def __str__(self) -> str:
+    return f"replayed {self.frames} frames in {self.seconds:.3f} s, {self.diverged} writes diverged from the trace"
+
+
+# run node(people, channels) on fresh replay channels of the trace
+def replay(trace: Trace, node: Callable[[List[Record], dict[str, ReplayChannel]], None], paced: bool = False) -> ReplayReport:
+  channels = trace.channels(paced)
+  start = time.perf_counter()
+  node(trace.people, channels)
+  return ReplayReport(time.perf_counter() - start, sum([len(records) for records in trace.links.values()]),
+                      sum([chan.diverged + abs(len(chan.writes) - chan.written) for chan in channels.values()]))
+
+
+if __name__ == '__main__':
+  import contextlib
+  import io
+  import task2
+  from log_sys import LOG
+
+  parser = argparse.ArgumentParser(description="replay a trace recorded by task2.brandy_sharded or task2.tandy through the same node")
+  parser.add_argument('trace')
+  parser.add_argument('--paced', action='store_true', help="deliver frames at their recorded times instead of at full speed")
+  parser.add_argument('--stream', action='store_true', help="the master streamed commands until the end of the stream, as with sim --stream")
+  args = parser.parse_args()
+
+  trace = Trace(args.trace)
+  if 'judge' in trace.links:
+    node = lambda people, chans: task2.brandy_sharded(people, chans['judge'], *[chans[name] for name in chans if name != 'judge'],
+                                                      operations=None if args.stream else 1000)
+  else:
+    node = lambda people, chans: task2.tandy(people, chans['master'])
+  with LOG.redirect(io.StringIO()), contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+    report = replay(trace, node, args.paced)
+  print(report)